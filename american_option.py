@@ -1,98 +1,696 @@
+import time
 import numpy as np
+import pandas as pd
 import plotly.graph_objs as go
 import streamlit as st
+from scipy.stats import norm
+from european_option import grant_table_inputs
 
 
-def binomial_tree_pricing(S, K, T, r, sigma, steps, q=0):
+LATTICE_SCHEMES = ("crr", "lr", "trinomial")
+
+
+def _lattice_parameters(T, r, sigma, steps, q):
     dt = T / steps
     u = np.exp(sigma * np.sqrt(dt))
     d = 1 / u
     p_up = (np.exp((r * dt) - (q * dt)) - d) / (u - d)
     p_down = 1 - p_up
+    return dt, u, d, p_up, p_down
+
+
+def _leisen_reimer_parameters(S, K, T, r, sigma, steps, q):
+    # Peizer-Pratt inversion of the Black-Scholes d1 and d2; steps must be odd
+    def h(z):
+        return 0.5 + np.sign(z) * 0.5 * np.sqrt(
+            1
+            - np.exp(
+                -((z / (steps + 1 / 3 + 0.1 / (steps + 1))) ** 2) * (steps + 1 / 6)
+            )
+        )
+
+    dt = T / steps
+    d1 = (np.log(S / K) + (r - q + sigma**2 / 2) * T) / (sigma * np.sqrt(T))
+    d2 = d1 - sigma * np.sqrt(T)
+    growth = np.exp((r - q) * dt)
+    p_up = h(d2)
+    u = growth * h(d1) / p_up
+    d = (growth - p_up * u) / (1 - p_up)
+    return dt, u, d, p_up, 1 - p_up
+
+
+def _intrinsic_value(prices, K, option_type):
+    if option_type == "call":
+        return np.maximum(prices - K, 0)
+    return np.maximum(K - prices, 0)
+
+
+def _roll_back_lattice(
+    S, K, T, r, sigma, steps, q, option_type="call", exercise="american", scheme="crr"
+):
+    # Inputs may be arrays of contracts sharing one step count; the lattice is
+    # then a (contracts x nodes) array rolled back together. Node values and
+    # prices of the first levels are kept for the Greeks.
+    if scheme not in LATTICE_SCHEMES:
+        raise ValueError(f"Unknown lattice scheme: {scheme}")
+    S, K, T, r, sigma, q = (
+        np.asarray(x, dtype=float)[..., None]
+        for x in np.broadcast_arrays(S, K, T, r, sigma, q)
+    )
+    american = exercise == "american"
+
+    if scheme == "trinomial":
+        # Log-space trinomial tree; node k of level i sits (i - k) moves up
+        dt = T / steps
+        dx = sigma * np.sqrt(3 * dt)
+        nu = r - q - sigma**2 / 2
+        spread = (sigma**2 * dt + nu**2 * dt**2) / dx**2
+        p_up = 0.5 * (spread + nu * dt / dx)
+        p_down = 0.5 * (spread - nu * dt / dx)
+        p_mid = 1 - p_up - p_down
 
-    asset_prices = np.zeros((steps + 1, steps + 1))
-    edv_values = np.zeros((steps + 1, steps + 1))
-    iv_values = np.zeros((steps + 1, steps + 1))
-    fv_values = np.zeros((steps + 1, steps + 1))
+        def level_prices(i):
+            return S * np.exp(dx * (i - np.arange(2 * i + 1)))
 
-    for i in range(steps + 1):
-        for j in range(i + 1):
-            asset_prices[j, i] = S * (u ** (i - j)) * (d**j)
+        def expectation(values, i):
+            return (
+                p_up * values[..., : 2 * i + 1]
+                + p_mid * values[..., 1 : 2 * i + 2]
+                + p_down * values[..., 2 : 2 * i + 3]
+            )
 
-    for j in range(steps + 1):
-        edv_values[j, steps] = max(0, asset_prices[j, steps] - K)
+        def level_width(i):
+            return 2 * i + 1
 
+        # Node k of level i sits at the same price as node k + 1 of level i + 1
+        def previous_level(prices, i):
+            return prices[..., 1 : 2 * i + 2]
+
+    else:
+        if scheme == "lr":
+            dt, u, d, p_up, p_down = _leisen_reimer_parameters(
+                S, K, T, r, sigma, steps, q
+            )
+        else:
+            dt, u, d, p_up, p_down = _lattice_parameters(T, r, sigma, steps, q)
+
+        # Node j of level i has seen j down moves
+        def level_prices(i):
+            j = np.arange(i + 1)
+            return S * np.exp(np.log(u) * (i - j) + np.log(d) * j)
+
+        def expectation(values, i):
+            return p_up * values[..., : i + 1] + p_down * values[..., 1 : i + 2]
+
+        def level_width(i):
+            return i + 1
+
+        # One fewer down move: node j of level i is node j + 1 of level i + 1
+        # divided by d
+        def previous_level(prices, i):
+            return prices[..., 1 : i + 2] / d
+
+    # Early exercise never pays for a call without a dividend yield (and a
+    # non-negative rate), so those lattices skip the exercise check
+    if option_type == "call" and np.all(q <= 0) and np.all(r >= 0):
+        american = False
+
+    discount = np.exp(-r * dt)
+    node_prices = level_prices(steps)
+    values = _intrinsic_value(node_prices, K, option_type)
+    levels = {steps: values.copy()} if steps <= 2 else {}
     for i in range(steps - 1, -1, -1):
-        for j in range(i + 1):
-            edv_values[j, i] = (
-                p_up * edv_values[j, i + 1] + p_down * edv_values[j + 1, i + 1]
-            ) / np.exp(r * dt)
-
-    for i in range(steps + 1):
-        for j in range(i + 1):
-            iv_values[j, i] = max(asset_prices[j, i] - K, 0)
-
-    for i in range(steps + 1):
-        for j in range(i + 1):
-            fv_values[j, i] = max(edv_values[j, i], iv_values[j, i])
-
-    final_option_price = fv_values[0, 0]
-
-    def plot_tree(tree_df, title):
-        edge_x = []
-        edge_y = []
-        node_x = []
-        node_y = []
-        node_text = []
-        midpoint = steps / 2
-
-        for i in range(steps + 1):
-            for j in range(i + 1):
-                x_pos = i
-                y_pos = j - (i / 2) + midpoint
-                value = tree_df[j, i]
-                node_x.append(x_pos)
-                node_y.append(y_pos)
-                node_text.append(f"{value:.2f}")
-
-                if i < steps:
-                    edge_x.extend([x_pos, x_pos + 1, None])
-                    edge_y.extend([y_pos, y_pos - 0.5, None])
-                    edge_x.extend([x_pos, x_pos + 1, None])
-                    edge_y.extend([y_pos, y_pos + 0.5, None])
-
-        edge_trace = go.Scatter(
-            x=edge_x,
-            y=edge_y,
-            line=dict(width=2, color="blue"),
-            hoverinfo="none",
-            mode="lines",
+        width = level_width(i)
+        values[..., :width] = discount * expectation(values, i)
+        if american:
+            # Early exercise is checked at every node, so it propagates back;
+            # node prices are stepped back by slicing instead of recomputed
+            node_prices = previous_level(node_prices, i)
+            values[..., :width] = np.maximum(
+                values[..., :width], _intrinsic_value(node_prices, K, option_type)
+            )
+        if i <= 2:
+            levels[i] = values[..., :width].copy()
+
+    prices = {i: level_prices(i) for i in levels}
+    return levels, prices, dt[..., 0]
+
+
+def binomial_tree_price(
+    S, K, T, r, sigma, steps, q=0, option_type="call", exercise="american", scheme="crr"
+):
+    scalar = all(np.ndim(x) == 0 for x in (S, K, T, r, sigma, q))
+    if scheme == "lr" and steps % 2 == 0:
+        steps += 1
+    levels = _roll_back_lattice(
+        S, K, T, r, sigma, steps, q, option_type, exercise, scheme
+    )[0]
+    price = levels[0][..., 0]
+    return float(price) if scalar else price
+
+
+def binomial_tree_greeks(
+    S, K, T, r, sigma, steps, q=0, option_type="call", exercise="american", scheme="crr"
+):
+    # Delta, gamma and theta read off the first levels of the same lattice
+    if steps < 2:
+        raise ValueError("Lattice Greeks need at least two steps")
+    if scheme == "lr" and steps % 2 == 0:
+        steps += 1
+    levels, prices, dt = _roll_back_lattice(
+        S, K, T, r, sigma, steps, q, option_type, exercise, scheme
+    )
+    price = levels[0][..., 0]
+
+    if scheme == "trinomial":
+        # The first trinomial level already spans up, middle and down nodes
+        V, P, horizon = levels[1], prices[1], dt
+    else:
+        V, P, horizon = levels[2], prices[2], 2 * dt
+    V_up, V_mid, V_down = V[..., 0], V[..., 1], V[..., 2]
+    S_up, S_mid, S_down = P[..., 0], P[..., 1], P[..., 2]
+
+    if scheme == "trinomial":
+        delta = (V_up - V_down) / (S_up - S_down)
+    else:
+        delta = (levels[1][..., 0] - levels[1][..., 1]) / (
+            prices[1][..., 0] - prices[1][..., 1]
+        )
+    gamma = (
+        (V_up - V_mid) / (S_up - S_mid) - (V_mid - V_down) / (S_mid - S_down)
+    ) / (0.5 * (S_up - S_down))
+    # The middle node keeps (about) the same spot, so this approximates dV/dt
+    theta = (V_mid - price) / horizon
+
+    return {"price": price, "delta": delta, "gamma": gamma, "theta": theta}
+
+
+def binomial_tree_richardson(S, K, T, r, sigma, steps, q=0, **lattice_options):
+    # The CRR and trinomial error is roughly proportional to 1 / steps, which
+    # the n / 2n combination cancels. Leisen-Reimer already converges at
+    # 1 / steps^2 and bumps even step counts to odd, so these weights are wrong
+    if lattice_options.get("scheme") == "lr":
+        raise ValueError("Richardson extrapolation needs the crr or trinomial scheme")
+    return 2 * binomial_tree_price(
+        S, K, T, r, sigma, 2 * steps, q, **lattice_options
+    ) - binomial_tree_price(S, K, T, r, sigma, steps, q, **lattice_options)
+
+
+def binomial_tree_to_accuracy(
+    S,
+    K,
+    T,
+    r,
+    sigma,
+    q=0,
+    tolerance=1e-4,
+    richardson=True,
+    start_steps=16,
+    max_steps=2**15,
+    **lattice_options,
+):
+    # Double the step count until successive prices agree to within tolerance,
+    # measured as a fraction of spot; returns the price and the finest step count
+    # Leisen-Reimer is refined on its own, without extrapolation
+    richardson = richardson and lattice_options.get("scheme") != "lr"
+    pricer = binomial_tree_richardson if richardson else binomial_tree_price
+    steps = start_steps
+    previous = pricer(S, K, T, r, sigma, steps, q, **lattice_options)
+    while steps < max_steps:
+        steps *= 2
+        price = pricer(S, K, T, r, sigma, steps, q, **lattice_options)
+        if np.all(np.abs(price - previous) <= tolerance * np.asarray(S)):
+            break
+        previous = price
+    return price, 2 * steps if richardson else steps
+
+
+def benchmark_lattice_schemes(
+    S,
+    K,
+    T,
+    r,
+    sigma,
+    q=0,
+    option_type="put",
+    tolerance=1e-4,
+    max_steps=2000,
+    reference_steps=20001,
+):
+    # Smallest step count on a geometric grid from which each scheme stays
+    # within tolerance (a fraction of spot, 1bp by default) of a fine LR price
+    reference = binomial_tree_price(
+        S, K, T, r, sigma, reference_steps, q, option_type, scheme="lr"
+    )
+    grid = np.unique(np.geomspace(4, max_steps, 40).astype(int))
+
+    rows = []
+    for scheme in LATTICE_SCHEMES:
+        start = time.perf_counter()
+        errors = np.array(
+            [
+                abs(
+                    binomial_tree_price(
+                        S, K, T, r, sigma, int(n), q, option_type, scheme=scheme
+                    )
+                    - reference
+                )
+                / S
+                for n in grid
+            ]
+        )
+        elapsed = time.perf_counter() - start
+        outside = np.flatnonzero(errors > tolerance)
+        if len(outside) == 0:
+            steps_needed = grid[0]
+        elif outside[-1] + 1 < len(grid):
+            steps_needed = grid[outside[-1] + 1]
+        else:
+            steps_needed = np.nan
+        rows.append(
+            {
+                "Scheme": scheme,
+                "Steps to Accuracy": steps_needed,
+                "Error at Max Steps (bp)": errors[-1] * 1e4,
+                "Sweep Time (s)": elapsed,
+            }
         )
-        node_trace = go.Scatter(
+
+    return pd.DataFrame(rows), reference
+
+
+def _generalized_black_scholes(S, K, T, r, b, sigma, option_type):
+    # European value with cost of carry b = r - q
+    d1 = (np.log(S / K) + (b + sigma**2 / 2) * T) / (sigma * np.sqrt(T))
+    d2 = d1 - sigma * np.sqrt(T)
+    if option_type == "call":
+        return S * np.exp((b - r) * T) * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
+    return K * np.exp(-r * T) * norm.cdf(-d2) - S * np.exp((b - r) * T) * norm.cdf(-d1)
+
+
+def _baw_critical_price(K, T, r, b, sigma, option_type, q_exp, iterations=100):
+    # Vectorized Newton iteration for the early-exercise boundary (Haug's seed)
+    sqrt_T = sigma * np.sqrt(T)
+    N = 2 * b / sigma**2
+    M = 2 * r / sigma**2
+    carry = np.exp((b - r) * T)
+    if option_type == "call":
+        q_inf = (-(N - 1) + np.sqrt((N - 1) ** 2 + 4 * M)) / 2
+        S_inf = K / (1 - 1 / q_inf)
+        h = -(b * T + 2 * sqrt_T) * K / (S_inf - K)
+        Si = K + (S_inf - K) * (1 - np.exp(h))
+    else:
+        q_inf = (-(N - 1) - np.sqrt((N - 1) ** 2 + 4 * M)) / 2
+        S_inf = K / (1 - 1 / q_inf)
+        h = (b * T - 2 * sqrt_T) * K / (K - S_inf)
+        Si = S_inf + (K - S_inf) * np.exp(h)
+
+    for _ in range(iterations):
+        d1 = (np.log(Si / K) + (b + sigma**2 / 2) * T) / sqrt_T
+        european = _generalized_black_scholes(Si, K, T, r, b, sigma, option_type)
+        if option_type == "call":
+            lhs = Si - K
+            rhs = european + (1 - carry * norm.cdf(d1)) * Si / q_exp
+            slope = carry * norm.cdf(d1) * (1 - 1 / q_exp) + (
+                1 - carry * norm.pdf(d1) / sqrt_T
+            ) / q_exp
+            Si_next = (K + rhs - slope * Si) / (1 - slope)
+        else:
+            lhs = K - Si
+            rhs = european - (1 - carry * norm.cdf(-d1)) * Si / q_exp
+            slope = -carry * norm.cdf(-d1) * (1 - 1 / q_exp) - (
+                1 + carry * norm.pdf(-d1) / sqrt_T
+            ) / q_exp
+            Si_next = (K - rhs + slope * Si) / (1 + slope)
+        converged = np.abs(lhs - rhs) / K < 1e-8
+        Si = np.where(converged, Si, Si_next)
+        if np.all(converged):
+            break
+    return Si
+
+
+def barone_adesi_whaley(S, K, T, r, sigma, q=0, option_type="call"):
+    S, K, T, r, sigma, q = (
+        np.asarray(x, dtype=float) for x in np.broadcast_arrays(S, K, T, r, sigma, q)
+    )
+    b = r - q
+    european = _generalized_black_scholes(S, K, T, r, b, sigma, option_type)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        N = 2 * b / sigma**2
+        M = 2 * r / sigma**2
+        K_ = -np.expm1(-r * T)
+        # M / K_ tends to 2 / (sigma^2 T) as the rate goes to zero
+        root = np.sqrt((N - 1) ** 2 + 4 * np.where(r == 0, 2 / (sigma**2 * T), M / K_))
+        carry = np.exp((b - r) * T)
+        sqrt_T = sigma * np.sqrt(T)
+        if option_type == "call":
+            q2 = (-(N - 1) + root) / 2
+            S_star = _baw_critical_price(K, T, r, b, sigma, "call", q2)
+            d1 = (np.log(S_star / K) + (b + sigma**2 / 2) * T) / sqrt_T
+            A2 = (S_star / q2) * (1 - carry * norm.cdf(d1))
+            american = np.where(
+                S < S_star, european + A2 * (S / S_star) ** q2, S - K
+            )
+            # Without a dividend yield an American call is never exercised early
+            no_early_exercise = b >= r
+        else:
+            q1 = (-(N - 1) - root) / 2
+            S_star = _baw_critical_price(K, T, r, b, sigma, "put", q1)
+            d1 = (np.log(S_star / K) + (b + sigma**2 / 2) * T) / sqrt_T
+            A1 = -(S_star / q1) * (1 - carry * norm.cdf(-d1))
+            american = np.where(
+                S > S_star, european + A1 * (S / S_star) ** q1, K - S
+            )
+            # Without a positive rate an American put is never exercised early
+            no_early_exercise = r <= 0
+
+    # The approximation never prices below the European value or immediate
+    # exercise
+    intrinsic = _intrinsic_value(S, K, option_type)
+    american = np.maximum(american, np.maximum(european, intrinsic))
+    return np.where(no_early_exercise, european, american)
+
+
+def _bjerksund_stensland_call(S, K, T, r, b, sigma):
+    def phi(S, T, gamma, H, I):
+        lam = (-r + gamma * b + 0.5 * gamma * (gamma - 1) * sigma**2) * T
+        d = -(np.log(S / H) + (b + (gamma - 0.5) * sigma**2) * T) / (
+            sigma * np.sqrt(T)
+        )
+        kappa = 2 * b / sigma**2 + (2 * gamma - 1)
+        return (
+            np.exp(lam)
+            * S**gamma
+            * (
+                norm.cdf(d)
+                - (I / S) ** kappa * norm.cdf(d - 2 * np.log(I / S) / (sigma * np.sqrt(T)))
+            )
+        )
+
+    european = _generalized_black_scholes(S, K, T, r, b, sigma, "call")
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        beta = (0.5 - b / sigma**2) + np.sqrt((b / sigma**2 - 0.5) ** 2 + 2 * r / sigma**2)
+        B_inf = beta / (beta - 1) * K
+        B_0 = np.maximum(K, r / (r - b) * K)
+        h = -(b * T + 2 * sigma * np.sqrt(T)) * B_0 / (B_inf - B_0)
+        I = B_0 + (B_inf - B_0) * (1 - np.exp(h))
+        alpha = (I - K) * I ** (-beta)
+        american = np.where(
+            S < I,
+            alpha * S**beta
+            - alpha * phi(S, T, beta, I, I)
+            + phi(S, T, 1, I, I)
+            - phi(S, T, 1, K, I)
+            - K * phi(S, T, 0, I, I)
+            + K * phi(S, T, 0, K, I),
+            S - K,
+        )
+    # Without a dividend yield an American call is never exercised early
+    return np.where(b >= r, european, np.maximum(american, european))
+
+
+def bjerksund_stensland(S, K, T, r, sigma, q=0, option_type="call"):
+    S, K, T, r, sigma, q = (
+        np.asarray(x, dtype=float) for x in np.broadcast_arrays(S, K, T, r, sigma, q)
+    )
+    if option_type == "call":
+        return _bjerksund_stensland_call(S, K, T, r, r - q, sigma)
+    # Put-call transformation: P(S, K, r, q) = C(K, S, q, r)
+    return _bjerksund_stensland_call(K, S, T, q, q - r, sigma)
+
+
+AMERICAN_APPROXIMATIONS = {
+    "barone_adesi_whaley": barone_adesi_whaley,
+    "bjerksund_stensland": bjerksund_stensland,
+}
+
+
+def check_american_approximation(
+    S,
+    K,
+    T,
+    r,
+    sigma,
+    q=0,
+    option_type="call",
+    method="bjerksund_stensland",
+    steps=1000,
+    sample_size=32,
+    tolerance=5e-4,
+    seed=None,
+):
+    # Reprice a random sample on the lattice; errors are measured as a fraction
+    # of spot, so the default tolerance is five basis points
+    S, K, T, r, sigma, q = (
+        np.asarray(x, dtype=float).ravel()
+        for x in np.broadcast_arrays(S, K, T, r, sigma, q)
+    )
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(S), size=min(sample_size, len(S)), replace=False)
+
+    approximation = AMERICAN_APPROXIMATIONS[method](
+        S[sample], K[sample], T[sample], r[sample], sigma[sample], q[sample], option_type
+    )
+    lattice = binomial_tree_price(
+        S[sample],
+        K[sample],
+        T[sample],
+        r[sample],
+        sigma[sample],
+        steps,
+        q[sample],
+        option_type,
+    )
+
+    errors = np.abs(approximation - lattice) / S[sample]
+    return {
+        "sample": sample,
+        "approximation": approximation,
+        "lattice": lattice,
+        "max_error": errors.max(),
+        "within_tolerance": bool(errors.max() <= tolerance),
+    }
+
+
+# Upper bound on lattice nodes held in memory per block of contracts
+LATTICE_BLOCK_ELEMENTS = 2**22
+
+
+def binomial_tree_batch(
+    df, steps=None, method="binomial", tolerance=5e-4, option_type="call"
+):
+    # Same contract columns and parsing as black_scholes_table; rates,
+    # volatility and dividend yield are in percent
+    df, inputs = grant_table_inputs(df)
+
+    # Monthly steps per contract, as on the single-contract page, unless fixed
+    if steps is None:
+        df["Steps"] = np.maximum(1, (df["Time to Maturity"] * 12).astype(int))
+    else:
+        df["Steps"] = int(steps)
+
+    S, X, T, r, sigma, q = (inputs[name] for name in ("S", "X", "T", "r", "sigma", "q"))
+    step_counts = df["Steps"].to_numpy()
+
+    # Closed-form approximations are used for the whole book when a lattice
+    # check on a sample stays within tolerance; otherwise fall back to the tree
+    if method != "binomial" and len(df) > 0:
+        check = check_american_approximation(
+            S, X, T, r, sigma, q, option_type, method=method, tolerance=tolerance
+        )
+        if check["within_tolerance"]:
+            df["Mesop Value/ share"] = AMERICAN_APPROXIMATIONS[method](
+                S, X, T, r, sigma, q, option_type
+            )
+            df["Mesop Value"] = df["Mesop Value/ share"] * df[
+                "Number of shares"
+            ].to_numpy(dtype=float)
+            df["Pricing Method"] = method
+            return df
+
+    # Contracts with equal step counts share one vectorized lattice
+    prices = np.empty(len(df))
+    for n in np.unique(step_counts):
+        rows = np.flatnonzero(step_counts == n)
+        block = max(1, LATTICE_BLOCK_ELEMENTS // (int(n) + 1))
+        for start in range(0, len(rows), block):
+            idx = rows[start : start + block]
+            prices[idx] = binomial_tree_price(
+                S[idx], X[idx], T[idx], r[idx], sigma[idx], int(n), q[idx], option_type
+            )
+
+    df["Mesop Value/ share"] = prices
+    df["Mesop Value"] = prices * df["Number of shares"].to_numpy(dtype=float)
+    df["Pricing Method"] = "binomial"
+    return df
+
+
+def binomial_trees(S, K, T, r, sigma, steps, q=0, option_type="call", levels=None):
+    # Column k holds level levels[k] (every level by default) and row j the
+    # node after j down moves; rows past the level are unused. The lattice is
+    # rolled back one level at a time, so only the kept levels are stored
+    dt, u, d, p_up, p_down = _lattice_parameters(T, r, sigma, steps, q)
+    levels = np.arange(steps + 1) if levels is None else np.asarray(levels)
+    columns = {level: k for k, level in enumerate(levels)}
+    asset_prices, edv_values, iv_values, fv_values = (
+        np.zeros((steps + 1, len(levels))) for _ in range(4)
+    )
+
+    # EDV is the discounted expectation of next period's FV, and FV applies the
+    # exercise decision node by node
+    j = np.arange(steps + 1)
+    fv = None
+    for i in range(steps, -1, -1):
+        prices = S * u ** (i - j[: i + 1]) * d ** j[: i + 1]
+        iv = _intrinsic_value(prices, K, option_type)
+        if fv is None:
+            edv = iv
+        else:
+            edv = (p_up * fv[: i + 1] + p_down * fv[1 : i + 2]) / np.exp(r * dt)
+        fv = np.maximum(edv, iv)
+        if i in columns:
+            k = columns[i]
+            asset_prices[: i + 1, k] = prices
+            edv_values[: i + 1, k] = edv
+            iv_values[: i + 1, k] = iv
+            fv_values[: i + 1, k] = fv
+
+    return asset_prices, edv_values, iv_values, fv_values
+
+
+# Hard cap on plotted nodes (or heatmap cells) per tree, and the size below
+# which every node still gets a text label
+TREE_NODE_BUDGET = 2000
+TREE_LABEL_BUDGET = 300
+
+
+def plotted_levels(steps, max_nodes=TREE_NODE_BUDGET, mode="auto"):
+    # Resolves the plot mode and the levels plot_tree keeps, so large trees
+    # can be built for those levels only
+    total_nodes = (steps + 1) * (steps + 2) // 2
+    if mode == "auto":
+        mode = "graph" if total_nodes <= max_nodes else "heatmap"
+    elif mode == "graph" and total_nodes > max_nodes:
+        # The budget is hard; a full graph that does not fit drops levels
+        mode = "levels"
+
+    stride = 1
+    if mode == "levels":
+        # Keep every k-th level until the remaining nodes fit the budget
+        while (
+            sum(i + 1 for i in range(0, steps + 1, stride)) > max_nodes
+            and stride < steps
+        ):
+            stride += 1
+        if sum(i + 1 for i in range(0, steps + 1, stride)) > max_nodes:
+            # Even the first and last level alone are over budget
+            mode = "heatmap"
+    if mode == "heatmap":
+        # Stride both axes so the (time x node) grid fits the budget
+        stride = int(np.ceil((steps + 1) / max(1, int(np.sqrt(max_nodes)))))
+    return mode, np.arange(0, steps + 1, stride)
+
+
+def plot_tree(tree_df, title, max_nodes=TREE_NODE_BUDGET, mode="auto", levels=None):
+    # tree_df has a row per down move j and a column per level i (every level
+    # unless levels says which); mode is "graph", "levels" (every k-th level)
+    # or "heatmap"
+    steps = tree_df.shape[0] - 1
+    mode, kept = plotted_levels(steps, max_nodes, mode)
+    columns = np.arange(steps + 1) if levels is None else np.asarray(levels)
+    tree = np.asarray(tree_df)[:, np.searchsorted(columns, kept)]
+
+    layout = go.Layout(
+        title=title,
+        showlegend=False,
+        height=800,
+        xaxis=dict(showgrid=False, zeroline=False),
+        yaxis=dict(showgrid=False, zeroline=False),
+        template="plotly_white",
+    )
+
+    if mode == "heatmap":
+        down_moves = kept
+        reachable = down_moves[:, None] <= kept
+        z = np.where(reachable, tree[down_moves], np.nan)
+        layout.update(xaxis_title="Step", yaxis_title="Down moves")
+        layout.yaxis.autorange = "reversed"
+        return go.Figure(
+            data=[go.Heatmap(z=z, x=kept, y=down_moves, colorscale="Viridis")],
+            layout=layout,
+        )
+
+    counts = kept + 1
+    i = np.repeat(kept, counts)
+    j = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    node_x = i
+    node_y = j - i / 2 + steps / 2
+    values = tree[j, np.repeat(np.arange(len(kept)), counts)]
+
+    traces = []
+    if len(kept) == steps + 1:
+        # Two segments per non-terminal node, separated by NaN gaps
+        inner = i < steps
+        x0, y0 = node_x[inner], node_y[inner]
+        gap = np.full(len(x0), np.nan)
+        edge_x = np.column_stack([x0, x0 + 1, gap, x0, x0 + 1, gap]).ravel()
+        edge_y = np.column_stack([y0, y0 - 0.5, gap, y0, y0 + 0.5, gap]).ravel()
+        traces.append(
+            go.Scatter(
+                x=edge_x,
+                y=edge_y,
+                line=dict(width=2, color="blue"),
+                hoverinfo="none",
+                mode="lines",
+            )
+        )
+
+    labelled = len(values) <= TREE_LABEL_BUDGET
+    traces.append(
+        go.Scatter(
             x=node_x,
             y=node_y,
-            mode="markers+text",
-            text=node_text,
+            mode="markers+text" if labelled else "markers",
+            text=[f"{value:.2f}" for value in values] if labelled else None,
             textposition="top center",
+            hovertext=None if labelled else np.round(values, 2),
             hoverinfo="text",
-            marker=dict(size=10, color="red", line_width=2),
+            marker=dict(
+                size=10 if labelled else 4, color="red", line_width=2 if labelled else 0
+            ),
         )
+    )
 
-        layout = go.Layout(
-            title=title,
-            showlegend=False,
-            height=800,
-            xaxis=dict(showgrid=False, zeroline=False),
-            yaxis=dict(showgrid=False, zeroline=False),
-            template="plotly_white",
+    return go.Figure(data=traces, layout=layout)
+
+
+def binomial_tree_pricing(
+    S, K, T, r, sigma, steps, q=0, option_type="call", plot=True
+):
+    if steps < 2:
+        final_option_price = binomial_tree_price(
+            S, K, T, r, sigma, steps, q, option_type
         )
+        greeks = None
+    else:
+        greeks = binomial_tree_greeks(S, K, T, r, sigma, steps, q, option_type)
+        final_option_price = float(greeks["price"])
+
+    if not plot:
+        return final_option_price
 
-        return go.Figure(data=[edge_trace, node_trace], layout=layout)
+    # Only the levels the charts keep are stored, so memory grows with steps
+    # times the plotted levels rather than steps squared
+    levels = plotted_levels(steps)[1]
+    asset_prices, edv_values, iv_values, fv_values = binomial_trees(
+        S, K, T, r, sigma, steps, q, option_type, levels
+    )
 
-    asset_fig = plot_tree(asset_prices, "Asset Price Tree")
-    edv_fig = plot_tree(edv_values, "EDV Option Tree")
-    iv_fig = plot_tree(iv_values, "IV Option Tree")
-    fv_fig = plot_tree(fv_values, "FV Option Tree")
+    asset_fig = plot_tree(asset_prices, "Asset Price Tree", levels=levels)
+    edv_fig = plot_tree(edv_values, "EDV Option Tree", levels=levels)
+    iv_fig = plot_tree(iv_values, "IV Option Tree", levels=levels)
+    fv_fig = plot_tree(fv_values, "FV Option Tree", levels=levels)
 
     st.plotly_chart(asset_fig)
     st.plotly_chart(edv_fig)
@@ -100,3 +698,11 @@ def binomial_tree_pricing(S, K, T, r, sigma, steps, q=0):
     st.plotly_chart(fv_fig)
 
     st.write(f"**Final Option Price**: ${final_option_price:.2f}")
+    if greeks is not None:
+        st.write(
+            f"**Delta**: {float(greeks['delta']):.4f} | "
+            f"**Gamma**: {float(greeks['gamma']):.6f} | "
+            f"**Theta**: {float(greeks['theta']):.2f} per year"
+        )
+
+    return final_option_price
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+
+# Discount for lack of marketability as a fraction of the marketable value.
+# Every model is element-wise over NumPy arrays, so volatilities and horizons
+# of any broadcastable shapes give a whole DLOM surface in one call
+
+
+def _excess_exp(x):
+    # e^x - x - 1 without cancellation for small x
+    return np.where(x < 1e-4, x**2 / 2 + x**3 / 6, np.expm1(x) - x)
+
+
+def protective_put(
+    volatility, time_to_liquidity, risk_free_rate, dividend_yield=0.0
+):
+    # Chaffe at-the-money protective put with spot and strike both 1
+    volatility, time_to_liquidity, risk_free_rate, dividend_yield = (
+        np.asarray(value, dtype=float)
+        for value in (volatility, time_to_liquidity, risk_free_rate, dividend_yield)
+    )
+    sigma_sqrt_t = volatility * np.sqrt(time_to_liquidity)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1 = (
+            risk_free_rate - dividend_yield + volatility**2 / 2
+        ) * time_to_liquidity / sigma_sqrt_t
+    d2 = d1 - sigma_sqrt_t
+    dlom = np.exp(-risk_free_rate * time_to_liquidity) * ndtr(-d2) - np.exp(
+        -dividend_yield * time_to_liquidity
+    ) * ndtr(-d1)
+    return {"d1": d1, "d2": d2, "dlom": dlom}
+
+
+def protective_put_dlom(
+    volatility, time_to_liquidity, risk_free_rate, dividend_yield=0.0
+):
+    return protective_put(
+        volatility, time_to_liquidity, risk_free_rate, dividend_yield
+    )["dlom"]
+
+
+def finnerty_dlom(
+    volatility, time_to_liquidity, risk_free_rate=0.0, dividend_yield=0.0
+):
+    # Finnerty (2012) average-strike put; the risk-free rate drops out
+    volatility = np.asarray(volatility, dtype=float)
+    time_to_liquidity = np.asarray(time_to_liquidity, dtype=float)
+    variance = volatility**2 * time_to_liquidity
+    with np.errstate(divide="ignore", invalid="ignore"):
+        v_sqrt_t = np.sqrt(
+            variance
+            + np.log(2 * _excess_exp(variance))
+            - 2 * np.log(np.expm1(variance))
+        )
+    return np.exp(-dividend_yield * time_to_liquidity) * (
+        ndtr(v_sqrt_t / 2) - ndtr(-v_sqrt_t / 2)
+    )
+
+
+def ghaidarov_dlom(
+    volatility, time_to_liquidity, risk_free_rate=0.0, dividend_yield=0.0
+):
+    # Ghaidarov (2014) average-strike put with the average's volatility
+    # matched to its lognormal moments
+    volatility = np.asarray(volatility, dtype=float)
+    time_to_liquidity = np.asarray(time_to_liquidity, dtype=float)
+    variance = volatility**2 * time_to_liquidity
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma_g_sqrt_t = np.sqrt(
+            np.log(2 * _excess_exp(variance)) - 2 * np.log(variance)
+        )
+    return np.exp(-dividend_yield * time_to_liquidity) * (
+        2 * ndtr(sigma_g_sqrt_t / 2) - 1
+    )
+
+
+DLOM_MODELS = {
+    "protective_put": protective_put_dlom,
+    "finnerty": finnerty_dlom,
+    "ghaidarov": ghaidarov_dlom,
+}
+
+
+def dlom_term_structure(
+    volatilities,
+    horizons,
+    risk_free_rate=0.0,
+    dividend_yield=0.0,
+    models=tuple(DLOM_MODELS),
+):
+    # Tidy table of every model over the volatility x horizon mesh
+    volatility, horizon = np.meshgrid(
+        np.asarray(volatilities, dtype=float),
+        np.asarray(horizons, dtype=float),
+        indexing="ij",
+    )
+    table = pd.DataFrame(
+        {"Volatility": volatility.ravel(), "Time to Liquidity": horizon.ravel()}
+    )
+    for model in models:
+        table[model] = DLOM_MODELS[model](
+            volatility, horizon, risk_free_rate, dividend_yield
+        ).ravel()
+    return table
@@ -2,18 +2,21 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from equities_income import equities_income
+from market_data_cache import market_data_cache
 from ticker_data_processor import get_ticker_data
 from bond_data_fetcher import get_bond_data
 from volatility_calculator import calculate_volatility
 from equities_market_function import (
-    generate_break_table,
-    generate_break_table_percent,
-    generate_break_table_bs,
-    generate_option_allocation_table,
-    calculate_break_table_ds,
-    calculate_estimated_volatility,
-    calculate_estimated_DLOM,
-    calculate_fair_value,
+    OPM_INPUT_COLUMNS,
+    cached_opm_breakpoints,
+    opm_backsolve,
+    opm_batch,
+    opm_batch_jobs,
+    opm_breakpoints,
+    opm_compute,
+    opm_sensitivity_grid,
+    opm_sensitivity_table,
+    opm_tables,
     format_value,
 )
 
@@ -86,10 +89,21 @@ def handle_ticker_input():
     ticker_list = st.session_state.stock_df["Stock Ticker"].tolist()
 
     if st.button("Calculate Volatility & Market Multiplier"):
-        data_ticker = get_ticker_data(ticker_list)
+        with st.spinner("Fetching comparables..."):
+            data_ticker = get_ticker_data(ticker_list)
         if data_ticker is not None:
             st.session_state.data_ticker_df = data_ticker
             st.session_state.multiplier_calculated = True
+            for ticker, error in data_ticker.attrs.get("failed", {}).items():
+                st.warning(f"Skipped {ticker}: {error}")
+        else:
+            st.error("Could not fetch data for any of the tickers.")
+        cache_metrics = market_data_cache.metrics()
+        st.caption(
+            f"Market data cache: {cache_metrics['memory_hits']} memory hits, "
+            f"{cache_metrics['disk_hits']} disk hits, "
+            f"{cache_metrics['misses']} misses"
+        )
 
     if st.session_state.get("multiplier_calculated"):
         display_calculated_volatility()
@@ -207,6 +221,80 @@ def equities_market():
     if st.button("Proceed with Valuation"):
         proceed_with_valuation()
 
+    with st.expander("Sensitivity Grid (volatility x time to liquidity)"):
+        handle_sensitivity_grid()
+
+    # Portfolio revaluation: many cap tables in one run
+    with st.expander("Batch Valuation (many companies)"):
+        handle_batch_valuation()
+
+
+# Function to show fair values over a volatility x time-to-liquidity mesh
+def handle_sensitivity_grid():
+    cols = st.columns(3)
+    volatility_from = cols[0].number_input("Volatility from", value=0.2, min_value=0.01)
+    volatility_to = cols[1].number_input("Volatility to", value=1.0, min_value=0.01)
+    volatility_count = cols[2].number_input("Volatility points", value=9, min_value=2)
+    cols = st.columns(3)
+    time_from = cols[0].number_input("Time to liquidity from", value=0.5, min_value=0.01)
+    time_to = cols[1].number_input("Time to liquidity to", value=5.0, min_value=0.01)
+    time_count = cols[2].number_input("Time points", value=10, min_value=2)
+
+    security = st.selectbox("Share class", st.session_state.df["Security"])
+    fields = {
+        "Fair value per share": "fair_value_per_share",
+        "Fair value of share class": "class_value",
+        "DLOM (B/A)": "dlom",
+    }
+    field = st.selectbox("Show", list(fields))
+
+    if st.button("Run Sensitivity Grid"):
+        grid = opm_sensitivity_grid(
+            cached_opm_breakpoints(st.session_state.df),
+            st.session_state.equity_value,
+            st.session_state.risk_free_rate,
+            np.linspace(volatility_from, volatility_to, int(volatility_count)),
+            np.linspace(time_from, time_to, int(time_count)),
+            st.session_state.dividend_yield,
+        )
+        table = opm_sensitivity_table(grid, security, fields[field])
+        st.dataframe(table.map(format_value), use_container_width=True)
+
+
+# Function to value many cap tables across companies and valuation dates
+def handle_batch_valuation():
+    st.write(
+        "Cap tables: one row per Company, Valuation Date and Security with the "
+        "columns of the table above. Inputs: one row per Company and "
+        f"Valuation Date with {', '.join(OPM_INPUT_COLUMNS)}; leave "
+        "equity_value empty to backsolve to the calibrate_to security."
+    )
+    cap_table_file = st.file_uploader("Cap tables (CSV)", type=["csv"])
+    inputs_file = st.file_uploader("Valuation inputs (CSV)", type=["csv"])
+    n_workers = st.number_input("Worker processes", value=4, min_value=1, step=1)
+
+    if cap_table_file and inputs_file and st.button("Run Batch Valuation"):
+        jobs = opm_batch_jobs(pd.read_csv(cap_table_file), pd.read_csv(inputs_file))
+        with st.spinner(f"Valuing {len(jobs)} cap tables..."):
+            results = opm_batch(jobs, n_workers=int(n_workers))
+
+        # Jobs are (Company, Valuation Date) pairs, so failures are counted the same way
+        failed = len(
+            results.loc[
+                results["Error"].notna(), ["Company", "Valuation Date"]
+            ].drop_duplicates()
+        )
+        st.write(
+            f"**Valued**: {len(jobs) - failed} of {len(jobs)} "
+            f"(slowest {results['Seconds'].max():.3f}s per company)"
+        )
+        st.dataframe(results, use_container_width=True)
+        st.download_button(
+            "Download results (CSV)",
+            results.to_csv(index=False),
+            file_name="opm_batch_results.csv",
+        )
+
 
 # Function to initialize input fields for equity valuation
 def initialize_valuation_inputs():
@@ -250,14 +338,85 @@ def initialize_valuation_inputs():
         st.session_state.df, num_rows="dynamic", use_container_width=True
     )
 
+    handle_equity_backsolve()
+
+
+# Everything a backsolved equity value depends on, so it is only reused while
+# the cap table, target and market inputs are unchanged
+def backsolve_inputs(df, security, target_price):
+    return (
+        tuple(df.columns),
+        tuple(pd.util.hash_pandas_object(df).tolist()),
+        security,
+        target_price,
+        st.session_state.risk_free_rate,
+        st.session_state.get("volatility"),
+        st.session_state.time_to_liquidity,
+        st.session_state.dividend_yield,
+    )
+
+
+# Function to calibrate the equity value to a recent round's issue price
+def handle_equity_backsolve():
+    if not st.checkbox("Backsolve equity value from a recent round"):
+        return
+
+    df = st.session_state.df
+    priced = df[df["Issue Price (USD)"].fillna(0) > 0]
+    cols = st.columns(2)
+    security = cols[0].selectbox("Calibrate to security", priced["Security"])
+    if security is None:
+        return
+    issue_price = priced.loc[priced["Security"] == security, "Issue Price (USD)"]
+    target_price = cols[1].number_input(
+        "Round price per share", value=float(issue_price.iloc[0]), min_value=0.0
+    )
+
+    inputs = backsolve_inputs(df, security, target_price)
+    if st.button("Backsolve Equity Value"):
+        if st.session_state.get("volatility") is None:
+            st.warning("Set the volatility in Step 2 before backsolving.")
+            return
+        try:
+            solution = opm_backsolve(
+                df,
+                security,
+                st.session_state.risk_free_rate,
+                st.session_state.volatility,
+                st.session_state.time_to_liquidity,
+                st.session_state.dividend_yield,
+                target_price=target_price,
+                equity_guess=st.session_state.get("backsolved_equity_value"),
+            )
+        except ValueError as error:
+            st.error(str(error))
+            return
+        st.session_state.backsolved_equity_value = solution["equity_value"]
+        st.session_state.backsolved_inputs = inputs
+        st.success(
+            f"Backsolved Equity Value: {solution['equity_value']:,.2f} "
+            f"({solution['evaluations']} OPM evaluations)"
+        )
+
+    if "backsolved_equity_value" not in st.session_state:
+        return
+    if st.session_state.get("backsolved_inputs") == inputs:
+        st.session_state.equity_value = st.session_state.backsolved_equity_value
+    else:
+        st.info(
+            "Inputs changed since the last backsolve; the default equity value "
+            "is used until you backsolve again."
+        )
+
 
 # Function to proceed with the full valuation process
 def proceed_with_valuation():
     with st.spinner("Processing... Please wait."):
         st.subheader("Final Edited Capitalization Table")
         st.dataframe(
-            st.session_state.df.applymap(format_value), use_container_width=True
+            st.session_state.df.map(format_value), use_container_width=True
         )
+        st.write(f"**Equity Value Used**: {st.session_state.equity_value:,.2f}")
 
         # Generate tables and calculate final values
         generate_and_display_all_tables()
@@ -265,86 +424,37 @@ def proceed_with_valuation():
 
 # Function to generate and display all tables related to equity valuation
 def generate_and_display_all_tables():
-    break_table = generate_break_table(st.session_state.df)
-    st.session_state.break_table = break_table
-    st.subheader("Generated Break Table")
-    st.dataframe(
-        st.session_state.break_table.applymap(format_value), use_container_width=True
-    )
-
-    break_table_percent = generate_break_table_percent(st.session_state.df, break_table)
-    st.session_state.break_table_percent = break_table_percent
-    st.subheader("Generated Break Table Percentages")
-    st.dataframe(st.session_state.break_table_percent, use_container_width=True)
-
-    break_table_bs = generate_break_table_bs(
-        st.session_state.break_table_percent,
+    # One fused OPM pass on arrays; DataFrames are only built for display
+    breakpoints = opm_breakpoints(st.session_state.df)
+    result = opm_compute(
+        breakpoints,
         st.session_state.equity_value,
         st.session_state.risk_free_rate,
         st.session_state.volatility,
         st.session_state.time_to_liquidity,
         st.session_state.dividend_yield,
     )
-    st.session_state.break_table_bs = break_table_bs
-    st.subheader("Generated Break Table (Black-Scholes)")
-    st.dataframe(
-        st.session_state.break_table_bs.applymap(format_value), use_container_width=True
-    )
-
-    break_table_oa = generate_option_allocation_table(
-        st.session_state.break_table,
-        st.session_state.break_table_bs,
-        st.session_state.break_table_percent,
-        st.session_state.df,
-    )
-    st.session_state.break_table_oa = break_table_oa
-    st.subheader("Generated Option Allocation Table")
-    st.dataframe(
-        st.session_state.break_table_oa.applymap(format_value), use_container_width=True
-    )
-
-    break_table_ds = calculate_break_table_ds(
-        st.session_state.break_table_bs,
-        st.session_state.break_table_percent,
-        st.session_state.df,
-    )
-    st.session_state.break_table_ds = break_table_ds
-    st.subheader("Calculated Delta Spread Table")
-    st.dataframe(st.session_state.break_table_ds, use_container_width=True)
-
-    estimated_volatility = calculate_estimated_volatility(
-        st.session_state.df,
-        st.session_state.break_table_ds,
-        st.session_state.break_table_oa,
-        st.session_state.equity_value,
-        st.session_state.volatility,
-    )
-    st.session_state.estimated_volatility = estimated_volatility
-    st.subheader("Estimated Volatility for Each Class")
-    st.dataframe(st.session_state.estimated_volatility, use_container_width=True)
-
-    estimated_DLOM = calculate_estimated_DLOM(
-        st.session_state.df,
-        st.session_state.break_table_oa,
-        st.session_state.estimated_volatility,
-        st.session_state.time_to_liquidity,
-        st.session_state.dividend_yield,
-        st.session_state.risk_free_rate,
-    )
-    st.session_state.estimated_DLOM = estimated_DLOM
-    st.subheader("Estimated DLOM for Each Class")
-    st.dataframe(
-        st.session_state.estimated_DLOM.applymap(format_value), use_container_width=True
-    )
-
-    fair_value = calculate_fair_value(
-        st.session_state.df, st.session_state.break_table_oa
-    )
-    st.session_state.fair_value = fair_value
-    st.subheader("Calculated Fair Value")
-    st.dataframe(
-        st.session_state.fair_value.applymap(format_value), use_container_width=True
-    )
+    tables = opm_tables(breakpoints, result)
+
+    sections = [
+        ("Generated Break Table", "break_table", True),
+        ("Generated Break Table Percentages", "break_table_percent", False),
+        ("Generated Break Table (Black-Scholes)", "break_table_bs", True),
+        ("Generated Option Allocation Table", "break_table_oa", True),
+        ("Calculated Delta Spread Table", "break_table_ds", False),
+        ("Estimated Volatility for Each Class", "estimated_volatility", False),
+        ("Estimated DLOM for Each Class", "estimated_DLOM", True),
+        ("DLOM Model Comparison", "dlom_models", False),
+        ("Calculated Fair Value", "fair_value", True),
+    ]
+    for title, name, formatted in sections:
+        table = tables[name]
+        st.subheader(title)
+        st.dataframe(
+            table.map(format_value) if formatted else table,
+            use_container_width=True,
+        )
+    return tables
 
 
 if __name__ == "__main__":
@@ -1,7 +1,14 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 import pandas as pd
 import numpy as np
 import scipy.stats as stats
 import math
+from scipy.optimize import brentq
+from scipy.special import ndtr
+from dlom_calculator import finnerty_dlom, ghaidarov_dlom, protective_put
 
 # Function to format numbers for display (thousands separator)
 def format_value(x):
@@ -10,101 +17,72 @@ def format_value(x):
     return x
 
 
-def generate_break_table(df):
-    # Step 1: Generate unique seniority levels and create preference_base_payout DataFrame
-    unique_seniority = np.array(df["Seniority"].dropna().unique().astype(int))
-    preference_base_payout = pd.DataFrame(
-        index=range(len(unique_seniority)), columns=df["Security"].to_list()
-    )
-
-    # Step 2: Fill the preference_base_payout DataFrame
-    for i in range(len(preference_base_payout)):
-        for j in range(len(df)):
-            if not pd.isna(df["Seniority"][j]) and int(df["Seniority"][j]) == i + 1:
-                preference_base_payout[df["Security"][j]][i] = (
-                    df["Shares Outstanding"][j]
-                    * df["Issue Price (USD)"][j]
-                    * df["Liquidation Preference"][j]
-                )
-
-    # Step 3: Create rest_payout DataFrame
-    rest_payout = pd.DataFrame(columns=df["Security"].to_list())
-    df_price_sort = df.sort_values(by="Issue Price (USD)", ascending=True).reset_index(
-        drop=True
-    )
-
-    # Step 4: Fill the rest_payout DataFrame
-    for i in range(len(df_price_sort) - 1):
-        for j in range(len(df_price_sort["Security"])):
-            security = df_price_sort["Security"][j]
-            shares_outstanding = (
-                df_price_sort["Shares Outstanding"]
-                .loc[df_price_sort["Security"] == security]
-                .values[0]
-            )
-            price_diff = (
-                df_price_sort["Issue Price (USD)"].iloc[i + 1]
-                - df_price_sort["Issue Price (USD)"].iloc[i]
-            )
-
-            if (
-                df_price_sort["Participating"]
-                .loc[df_price_sort["Security"] == security]
-                .values[0]
-                != "No"
-            ):
-                rest_payout.loc[i, security] = shares_outstanding * price_diff
-            else:
-                if i < j:
-                    rest_payout.loc[i, security] = 0
-                else:
-                    rest_payout.loc[i, security] = shares_outstanding * price_diff
-
-    no_participating_df = df_price_sort[df_price_sort["Participating"] == "No"]
-    max_price_row = no_participating_df["Issue Price (USD)"].idxmax()
-
-    rest_payout = rest_payout[:max_price_row]
-
-    # Step 5: Combine preference_base_payout and rest_payout
-    break_table = pd.concat(
-        [preference_base_payout, rest_payout], axis=0, ignore_index=True
+def _waterfall(df):
+    # Array-based liquidation waterfall: preference tranches by seniority,
+    # then catch-up tranches between consecutive issue prices. Returns the
+    # security names, the payout matrix (classes plus Total, with a total
+    # row) and the breakpoint each row starts from
+    securities = df["Security"].to_list()
+    shares = df["Shares Outstanding"].to_numpy(dtype=float)
+    issue_price = df["Issue Price (USD)"].to_numpy(dtype=float)
+    seniority = df["Seniority"].to_numpy(dtype=float)
+    preference = df["Liquidation Preference"].to_numpy(dtype=float)
+    participating = (df["Participating"] != "No").to_numpy()
+
+    # Step 1: One preference row per seniority level 1..k; securities outside
+    # a level are left as NaN (kept as non-zero when filtering rows below)
+    n_levels = len(np.unique(seniority[~np.isnan(seniority)]))
+    levels = np.arange(1, n_levels + 1)
+    preference_base_payout = np.where(
+        np.trunc(seniority)[None, :] == levels[:, None],
+        (shares * issue_price * preference)[None, :],
+        np.nan,
     )
 
-    # Remove rows with all zeros
-    break_table = break_table[(break_table.T != 0).any()]
+    # Step 2: Catch-up tranches between consecutive sorted issue prices. A
+    # non-participating security only joins once the tranche reaches its
+    # own issue price (sorted position j <= tranche i)
+    order = np.argsort(issue_price, kind="stable")
+    price_diff = np.diff(issue_price[order])
+    sorted_position = np.arange(len(order))
+    shares_in = participating[order][None, :] | (
+        sorted_position[None, :] <= sorted_position[:-1, None]
+    )
+    rest_payout = np.empty((len(price_diff), len(order)))
+    rest_payout[:, order] = price_diff[:, None] * shares[order][None, :] * shares_in
+
+    # Tranches stop at the highest non-participating issue price
+    no_participating = np.flatnonzero(~participating[order])
+    if no_participating.size == 0:
+        raise ValueError("The waterfall needs a non-participating security")
+    max_price_row = no_participating[np.argmax(issue_price[order][no_participating])]
+    rest_payout = rest_payout[:max_price_row]
 
-    # Reset index
-    break_table = break_table.reset_index(drop=True)
+    # Step 3: Combine, drop rows of exact zeros, then fill the gaps
+    payout = np.vstack([preference_base_payout, rest_payout])
+    payout = payout[(payout != 0).any(axis=1)]
+    payout = np.nan_to_num(payout, nan=0.0)
 
-    # Step 6: Add a 'Total' column
-    break_table = break_table.fillna(0)
-    break_table["Total"] = break_table.sum(axis=1)
+    # Step 4: Totals per tranche plus a total row, and the breakpoints
+    payout = np.column_stack([payout, payout.sum(axis=1)])
+    payout = np.vstack([payout, payout.sum(axis=0)])
+    aggregate_value = np.cumsum(payout[:, -1])
+    break_point_from = np.concatenate([[0.0], aggregate_value[:-1]])
+    return securities, payout, break_point_from
 
-    # Step 7: Add a total row
-    totals = break_table.sum()
-    break_table.loc[len(break_table)] = totals
 
-    # Step 8: Calculate 'Aggregate Value' and add 'Break Point From' and 'Break Point To' columns
-    break_table["Aggregate Value"] = break_table["Total"].cumsum()
-    break_table["Break Point From"] = break_table["Aggregate Value"].shift(1).fillna(0)
-    break_table["Break Point To"] = break_table["Aggregate Value"]
+def _break_table_frame(securities, payout, break_point_from):
+    break_point_to = np.append(break_point_from[1:], np.nan).astype(object)
+    break_point_to[-1] = "and up"
 
-    # Step 9: Reorder columns and drop 'Aggregate Value'
-    columns_to_move = ["Break Point From", "Break Point To"]
-    all_columns = break_table.columns.tolist()
-    new_order = columns_to_move + [
-        col for col in all_columns if col not in columns_to_move
-    ]
-    break_table = break_table[new_order]
-    break_table = break_table.drop(["Aggregate Value"], axis=1)
-
-    # Step 10: Set the last 'Break Point To' to 'and up'
-    break_table.loc[break_table.index[-1], "Break Point To"] = "and up"
+    break_table = pd.DataFrame(payout, columns=securities + ["Total"])
+    break_table.insert(0, "Break Point From", break_point_from)
+    break_table.insert(1, "Break Point To", break_point_to)
+    return break_table
 
-    # Step 11: Format numbers with thousand separators
-    # break_table = break_table.applymap(lambda x: f"{x:,.0f}" if isinstance(x, (int, float)) else x)
 
-    return break_table
+def generate_break_table(df):
+    return _break_table_frame(*_waterfall(df))
 
 
 def generate_break_table_percent(df, break_table):
@@ -113,11 +91,10 @@ def generate_break_table_percent(df, break_table):
     break_table_percent = break_table.copy()
 
     # Calculate the percentage values for each item in df_grouped['Security']
-    for i in range(len(break_table_percent)):
-        for item in df["Security"]:
-            break_table_percent[item][i] = 100 * (
-                break_table_percent[item][i] / break_table_percent["Total"][i]
-            )
+    security_list = df["Security"].to_list()
+    break_table_percent[security_list] = 100 * break_table_percent[
+        security_list
+    ].div(break_table_percent["Total"], axis=0)
 
     # Recalculate the 'Total' column in percentage terms
     break_table_percent["Total"] = break_table_percent[df["Security"].to_list()].sum(
@@ -194,15 +171,17 @@ def generate_break_table_bs(
     break_table_bs["Incremental Value"] = break_table_bs["Call Price"] - break_table_bs[
         "Call Price"
     ].shift(-1)
-    break_table_bs["Incremental Value"].fillna(
-        break_table_bs["Call Price"], inplace=True
+    break_table_bs["Incremental Value"] = break_table_bs["Incremental Value"].fillna(
+        break_table_bs["Call Price"]
     )
 
     # Calculate the Weighted Ndi
     break_table_bs["Weighted Ndi"] = break_table_bs["N(d1)"] - break_table_bs[
         "N(d1)"
     ].shift(-1)
-    break_table_bs["Weighted Ndi"].fillna(break_table_bs["N(d1)"], inplace=True)
+    break_table_bs["Weighted Ndi"] = break_table_bs["Weighted Ndi"].fillna(
+        break_table_bs["N(d1)"]
+    )
 
     return break_table_bs
 
@@ -246,7 +225,9 @@ def calculate_break_table_ds(break_table_bs, break_table_percent, df):
     break_table_ds["Incremental N(d1)"] = break_table_ds["N(d1)"] - break_table_ds[
         "N(d1)"
     ].shift(-1)
-    break_table_ds["Incremental N(d1)"].fillna(break_table_ds["N(d1)"], inplace=True)
+    break_table_ds["Incremental N(d1)"] = break_table_ds["Incremental N(d1)"].fillna(
+        break_table_ds["N(d1)"]
+    )
 
     # Select the relevant columns from break_table_percent based on the grouped security names
     selected_columns = df["Security"].to_list()
@@ -344,47 +325,18 @@ def calculate_estimated_DLOM(
         "Volatility for Each Class"
     ]
 
-    # Function to calculate D1, D2, and Put value
-    def calculate_d1_d2_put(estimated_DLOM):
-        for col in estimated_DLOM.columns:
-            spot_price = estimated_DLOM.loc["Spot price", col]
-            strike_price = estimated_DLOM.loc["Strike price / breakpoint", col]
-            rfr = estimated_DLOM.loc["RFR", col]
-            implied_volatility = estimated_DLOM.loc["Implied volatility", col]
-            time_to_maturity = estimated_DLOM.loc["Time to maturity", col]
-
-            # Calculate D1
-            estimated_DLOM.loc["D1", col] = (
-                np.log(spot_price / strike_price)
-                + (rfr + (implied_volatility**2 / 2)) * time_to_maturity
-            ) / (implied_volatility * np.sqrt(time_to_maturity))
-
-            # Calculate D2
-            estimated_DLOM.loc["D2", col] = estimated_DLOM.loc["D1", col] - (
-                implied_volatility * np.sqrt(time_to_maturity)
-            )
-
-            # Calculate Put value
-            N_d1 = stats.norm.cdf(
-                -estimated_DLOM.loc["D1", col]
-            )  # Equivalent to 1 - NORM.S.DIST(D1)
-            N_d2 = stats.norm.cdf(
-                -estimated_DLOM.loc["D2", col]
-            )  # Equivalent to 1 - NORM.S.DIST(D2)
-
-            estimated_DLOM.loc["Put value", col] = (
-                strike_price * np.exp(-rfr * time_to_maturity) * N_d2
-            ) - (spot_price * N_d1)
-
-        return estimated_DLOM
-
-    # Apply the function to calculate D1, D2, and Put value
-    estimated_DLOM = calculate_d1_d2_put(estimated_DLOM)
-
-    # Calculate DLOM (B/A)
-    estimated_DLOM.loc["DLOM (B/A)"] = (
-        estimated_DLOM.loc["Put value"] / estimated_DLOM.loc["Spot price"]
+    # At-the-money protective put on every class at once; the put is struck
+    # at the class value, so the DLOM is the put as a fraction of it
+    put = protective_put(
+        estimated_DLOM.loc["Implied volatility"].to_numpy(dtype=float),
+        time_to_liquidity,
+        risk_free_rate,
     )
+    class_value = estimated_DLOM.loc["Spot price"].to_numpy(dtype=float)
+    estimated_DLOM.loc["D1"] = put["d1"]
+    estimated_DLOM.loc["D2"] = put["d2"]
+    estimated_DLOM.loc["Put value"] = put["dlom"] * class_value
+    estimated_DLOM.loc["DLOM (B/A)"] = np.where(class_value != 0, put["dlom"], np.nan)
 
     return estimated_DLOM
 
@@ -422,3 +374,594 @@ def calculate_fair_value(df, break_table_oa):
     )
 
     return fair_value
+
+
+# Fused OPM: the stages above, computed once on shared NumPy arrays.
+# opm_breakpoints holds everything that does not depend on the market
+# inputs, opm_compute is cheap enough to call inside solvers, and
+# opm_tables builds the display DataFrames only at the end
+def opm_breakpoints(df):
+    securities, payout, strike = _waterfall(df)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent = 100 * payout[:, :-1] / payout[:, -1:]
+    return {
+        "securities": securities,
+        "shares": df["Shares Outstanding"].to_numpy(dtype=float),
+        "issue_price": df["Issue Price (USD)"].to_numpy(dtype=float),
+        "payout": payout,
+        "strike": strike,
+        "percent": np.round(percent, 1),
+        "percent_total": np.nansum(percent, axis=1),
+    }
+
+
+def _next_tranche(values):
+    # values shifted up one tranche along the last axis, zero past the top
+    return np.concatenate(
+        [values[..., 1:], np.zeros_like(values[..., :1])], axis=-1
+    )
+
+
+def opm_compute(
+    breakpoints,
+    equity_value,
+    risk_free_rate,
+    volatility,
+    time_to_liquidity,
+    dividend_yield,
+):
+    # Market inputs are scalars or arrays of one common shape (a sensitivity
+    # grid); a trailing axis lines them up against tranches, then classes
+    market = {
+        "equity_value": equity_value,
+        "risk_free_rate": risk_free_rate,
+        "volatility": volatility,
+        "time_to_liquidity": time_to_liquidity,
+        "dividend_yield": dividend_yield,
+    }
+    E, r, sigma, T, q = (
+        value[..., None]
+        for value in np.broadcast_arrays(
+            *(np.asarray(value, dtype=float) for value in market.values())
+        )
+    )
+    strike = breakpoints["strike"]
+    share = breakpoints["percent"] / 100
+    sqrt_t = np.sqrt(T)
+    has_strike = strike > 0
+
+    # Black-Scholes call on total equity struck at every breakpoint
+    with np.errstate(divide="ignore"):
+        d1 = np.where(
+            has_strike,
+            (np.log(E / strike) + (r + sigma**2 / 2) * T) / (sigma * sqrt_t),
+            0,
+        )
+    d2 = np.where(has_strike, d1 - sigma * sqrt_t, 0)
+    N_d1 = np.where(has_strike, ndtr(d1), 1)
+    N_d2 = np.where(has_strike, ndtr(d2), 0)
+    call_price = E * np.exp(-q * T) * N_d1 - strike * np.exp(-r * T) * N_d2
+    incremental_value = call_price - _next_tranche(call_price)
+    incremental_N_d1 = N_d1 - _next_tranche(N_d1)
+
+    # Allocation and delta spread per tranche and class; empty tranches
+    # carry NaN shares and are skipped in the sums, as pandas does
+    allocation = share * incremental_value[..., None]
+    delta_spread = share * incremental_N_d1[..., None]
+    class_value = np.nansum(allocation, axis=-2)
+    weighted_N_d1 = np.nansum(delta_spread, axis=-2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s_over_k = E / class_value
+    class_volatility = weighted_N_d1 * s_over_k * sigma
+
+    # DLOM: at-the-money protective put on each class value, with the
+    # average-strike models alongside for comparison
+    put = protective_put(class_volatility, T, r)
+    dlom_d1, dlom_d2 = put["d1"], put["d2"]
+    put_value = class_value * put["dlom"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dlom = put_value / class_value
+    dlom_finnerty = finnerty_dlom(class_volatility, T)
+    dlom_ghaidarov = ghaidarov_dlom(class_volatility, T)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fair_value_per_share = class_value / breakpoints["shares"]
+        issue_price = breakpoints["issue_price"]
+        change = np.where(
+            issue_price != 0, fair_value_per_share / issue_price - 1, 0
+        )
+
+    return {
+        **market,
+        "d1": d1,
+        "d2": d2,
+        "N_d1": N_d1,
+        "N_d2": N_d2,
+        "call_price": call_price,
+        "incremental_value": incremental_value,
+        "incremental_N_d1": incremental_N_d1,
+        "allocation": allocation,
+        "delta_spread": delta_spread,
+        "class_value": class_value,
+        "weighted_N_d1": weighted_N_d1,
+        "s_over_k": s_over_k,
+        "class_volatility": class_volatility,
+        "dlom_d1": dlom_d1,
+        "dlom_d2": dlom_d2,
+        "put_value": put_value,
+        "dlom": dlom,
+        "dlom_finnerty": dlom_finnerty,
+        "dlom_ghaidarov": dlom_ghaidarov,
+        "fair_value_per_share": fair_value_per_share,
+        "change": change,
+    }
+
+
+def opm_tables(breakpoints, result):
+    # Same tables, labels and layout as the stage functions above
+    securities = breakpoints["securities"]
+    strike = breakpoints["strike"]
+    n_classes = len(securities)
+
+    break_table = _break_table_frame(
+        securities, breakpoints["payout"], strike
+    )
+
+    break_table_percent = break_table.copy()
+    break_table_percent[securities] = breakpoints["percent"]
+    break_table_percent["Total"] = breakpoints["percent_total"]
+
+    break_table_bs = pd.DataFrame(
+        {
+            "Strike": strike,
+            "d1": result["d1"],
+            "d2": result["d2"],
+            "N(d1)": result["N_d1"],
+            "N(d2)": result["N_d2"],
+            "Call Price": result["call_price"],
+            "Incremental Value": result["incremental_value"],
+            "Weighted Ndi": result["incremental_N_d1"],
+        }
+    )
+
+    break_table_oa = break_table[["Break Point From", "Break Point To"]].copy()
+    break_table_oa["Option Value"] = result["incremental_value"]
+    break_table_oa[securities] = result["allocation"]
+    break_table_oa["Total"] = np.nansum(result["allocation"], axis=1)
+
+    break_table_ds = pd.DataFrame(
+        {
+            "N(d1)": result["N_d1"],
+            "Incremental N(d1)": result["incremental_N_d1"],
+        }
+    )
+    break_table_ds[securities] = result["delta_spread"]
+    break_table_ds["Total"] = np.nansum(result["delta_spread"], axis=1)
+
+    estimated_volatility = pd.DataFrame(
+        [
+            result["weighted_N_d1"],
+            result["s_over_k"],
+            np.full(n_classes, result["volatility"]),
+            result["class_volatility"],
+        ],
+        index=[
+            "Weighted N(d1)",
+            "S/Ki",
+            "Aggregate Volatility",
+            "Volatility for Each Class",
+        ],
+        columns=securities,
+    )
+
+    estimated_DLOM = pd.DataFrame(
+        [
+            result["class_value"],
+            result["class_value"],
+            np.full(n_classes, result["time_to_liquidity"]),
+            np.full(n_classes, result["dividend_yield"]),
+            np.full(n_classes, result["risk_free_rate"]),
+            result["class_volatility"],
+            result["dlom_d1"],
+            result["dlom_d2"],
+            result["put_value"],
+            result["dlom"],
+        ],
+        index=[
+            "Strike price / breakpoint",
+            "Spot price",
+            "Time to maturity",
+            "Dividends",
+            "RFR",
+            "Implied volatility",
+            "D1",
+            "D2",
+            "Put value",
+            "DLOM (B/A)",
+        ],
+        columns=securities,
+    )
+
+    dlom_models = pd.DataFrame(
+        [
+            result["class_volatility"],
+            result["dlom"],
+            result["dlom_finnerty"],
+            result["dlom_ghaidarov"],
+        ],
+        index=[
+            "Implied volatility",
+            "Protective put",
+            "Finnerty",
+            "Ghaidarov",
+        ],
+        columns=securities,
+    )
+
+    fair_value = pd.DataFrame(
+        [
+            result["class_value"],
+            breakpoints["shares"],
+            result["fair_value_per_share"],
+            breakpoints["issue_price"],
+            result["change"],
+        ],
+        index=[
+            "Fair value of share class",
+            "Number of shares",
+            "Fair value per share",
+            "Issue price per share",
+            "% change",
+        ],
+        columns=securities,
+    )
+
+    return {
+        "break_table": break_table,
+        "break_table_percent": break_table_percent,
+        "break_table_bs": break_table_bs,
+        "break_table_oa": break_table_oa,
+        "break_table_ds": break_table_ds,
+        "estimated_volatility": estimated_volatility,
+        "estimated_DLOM": estimated_DLOM,
+        "dlom_models": dlom_models,
+        "fair_value": fair_value,
+    }
+
+
+def opm_sensitivity_grid(
+    breakpoints,
+    equity_value,
+    risk_free_rate,
+    volatilities,
+    times_to_liquidity,
+    dividend_yield,
+):
+    # Breakpoints are shared; the Black-Scholes strip is broadcast over the
+    # volatility x time-to-liquidity mesh in one opm_compute call. Cubes are
+    # indexed [volatility, time_to_liquidity, class]
+    volatilities = np.asarray(volatilities, dtype=float)
+    times_to_liquidity = np.asarray(times_to_liquidity, dtype=float)
+    result = opm_compute(
+        breakpoints,
+        equity_value,
+        risk_free_rate,
+        volatilities[:, None],
+        times_to_liquidity[None, :],
+        dividend_yield,
+    )
+    return {
+        "securities": breakpoints["securities"],
+        "volatility": volatilities,
+        "time_to_liquidity": times_to_liquidity,
+        "fair_value_per_share": result["fair_value_per_share"],
+        "class_value": result["class_value"],
+        "class_volatility": result["class_volatility"],
+        "dlom": result["dlom"],
+        "dlom_finnerty": result["dlom_finnerty"],
+        "dlom_ghaidarov": result["dlom_ghaidarov"],
+    }
+
+
+def opm_sensitivity_table(grid, security, field="fair_value_per_share"):
+    # One class slice of a grid cube: volatility down, time across
+    column = grid["securities"].index(security)
+    return pd.DataFrame(
+        grid[field][:, :, column],
+        index=pd.Index(grid["volatility"], name="Volatility"),
+        columns=pd.Index(grid["time_to_liquidity"], name="Time to Liquidity"),
+    )
+
+
+# Breakpoints only depend on the cap table, so repeated backsolves (warm
+# restarts, sensitivity runs) reuse them; keyed on the waterfall columns
+BREAKPOINT_CACHE_SIZE = 32
+_breakpoint_cache = {}
+_WATERFALL_COLUMNS = [
+    "Security",
+    "Shares Outstanding",
+    "Seniority",
+    "Issue Price (USD)",
+    "Liquidation Preference",
+    "Participating",
+]
+
+
+def cached_opm_breakpoints(df):
+    key = pd.util.hash_pandas_object(
+        df[_WATERFALL_COLUMNS].astype(str), index=False
+    ).values.tobytes()
+    if key not in _breakpoint_cache:
+        if len(_breakpoint_cache) >= BREAKPOINT_CACHE_SIZE:
+            _breakpoint_cache.pop(next(iter(_breakpoint_cache)))
+        _breakpoint_cache[key] = opm_breakpoints(df)
+    return _breakpoint_cache[key]
+
+
+def opm_backsolve(
+    df,
+    security,
+    risk_free_rate,
+    volatility,
+    time_to_liquidity,
+    dividend_yield,
+    target_price=None,
+    equity_guess=None,
+    breakpoints=None,
+    tolerance=1e-6,
+    max_expansions=60,
+):
+    # Equity value at which the OPM fair value per share of `security`
+    # equals target_price (its issue price by default). Brent's method on a
+    # bracket grown geometrically around equity_guess, which should be the
+    # previous solution when re-solving
+    if breakpoints is None:
+        breakpoints = cached_opm_breakpoints(df)
+    if security not in breakpoints["securities"]:
+        raise ValueError(f"Security {security!r} is not in the cap table")
+    column = breakpoints["securities"].index(security)
+    if target_price is None:
+        target_price = breakpoints["issue_price"][column]
+    if not target_price > 0:
+        raise ValueError("Target price per share must be positive")
+
+    evaluations = 0
+
+    def price_gap(equity_value):
+        nonlocal evaluations
+        evaluations += 1
+        result = opm_compute(
+            breakpoints,
+            equity_value,
+            risk_free_rate,
+            volatility,
+            time_to_liquidity,
+            dividend_yield,
+        )
+        return result["fair_value_per_share"][column] - target_price
+
+    # Without a warm start, price every share at the round price and open a
+    # wider bracket; a previous solution only needs a narrow one
+    if equity_guess is None or not equity_guess > 0:
+        equity_guess = target_price * np.nansum(breakpoints["shares"])
+        step = 1.25
+    else:
+        step = 1.02
+    lower, upper = equity_guess / step, equity_guess * step
+    gap_lower, gap_upper = price_gap(lower), price_gap(upper)
+    for _ in range(max_expansions):
+        if gap_lower <= 0 <= gap_upper:
+            break
+        step *= 2
+        if gap_lower > 0:
+            upper, gap_upper = lower, gap_lower
+            lower = lower / step
+            gap_lower = price_gap(lower)
+        else:
+            lower, gap_lower = upper, gap_upper
+            upper = upper * step
+            gap_upper = price_gap(upper)
+    else:
+        raise ValueError(
+            f"Could not bracket an equity value pricing {security!r} at "
+            f"{target_price}"
+        )
+
+    equity_value, report = brentq(
+        price_gap,
+        lower,
+        upper,
+        xtol=tolerance * equity_guess,
+        rtol=1e-12,
+        full_output=True,
+    )
+    result = opm_compute(
+        breakpoints,
+        equity_value,
+        risk_free_rate,
+        volatility,
+        time_to_liquidity,
+        dividend_yield,
+    )
+    return {
+        "equity_value": equity_value,
+        "fair_value_per_share": result["fair_value_per_share"][column],
+        "target_price": target_price,
+        "evaluations": evaluations,
+        "converged": report.converged,
+        "result": result,
+    }
+
+
+# Batch OPM across companies and valuation dates. A job is a dict with
+# "Company", "Valuation Date", "cap_table" and the OPM inputs; when
+# "equity_value" is missing the job is backsolved to "calibrate_to"
+OPM_INPUT_COLUMNS = [
+    "equity_value",
+    "risk_free_rate",
+    "volatility",
+    "time_to_liquidity",
+    "dividend_yield",
+    "calibrate_to",
+]
+OPM_BATCH_COLUMNS = [
+    "Company",
+    "Valuation Date",
+    "Security",
+    "Equity Value",
+    "Fair value of share class",
+    "Number of shares",
+    "Fair value per share",
+    "Issue price per share",
+    "% change",
+    "Volatility for Each Class",
+    "DLOM (B/A)",
+    "Seconds",
+    "Error",
+]
+
+
+def opm_batch_jobs(cap_tables, inputs):
+    # Long cap-table frame (one row per company, date and security) joined
+    # to one row of inputs per company and date
+    keys = ["Company", "Valuation Date"]
+    tables = dict(iter(cap_tables.groupby(keys, sort=False)))
+    jobs = []
+    for record in inputs.to_dict("records"):
+        key = (record["Company"], record["Valuation Date"])
+        job = {
+            "Company": key[0],
+            "Valuation Date": key[1],
+            "cap_table": tables.get(key),
+        }
+        for column in OPM_INPUT_COLUMNS:
+            value = record.get(column)
+            job[column] = None if pd.isna(value) else value
+        jobs.append(job)
+    return jobs
+
+
+def _value_company(job):
+    # Errors are returned as data so one bad cap table cannot stop the batch
+    start = time.perf_counter()
+    rows = []
+    error = None
+    try:
+        if job.get("cap_table") is None:
+            raise ValueError("No cap table for this company and date")
+        df = job["cap_table"].reset_index(drop=True)
+        breakpoints = opm_breakpoints(df)
+        market_inputs = [
+            job["risk_free_rate"],
+            job["volatility"],
+            job["time_to_liquidity"],
+            job.get("dividend_yield") or 0.0,
+        ]
+        equity_value = job.get("equity_value")
+        if equity_value is None:
+            equity_value = opm_backsolve(
+                df, job["calibrate_to"], *market_inputs, breakpoints=breakpoints
+            )["equity_value"]
+        result = opm_compute(breakpoints, equity_value, *market_inputs)
+
+        for i, security in enumerate(breakpoints["securities"]):
+            rows.append(
+                {
+                    "Security": security,
+                    "Equity Value": equity_value,
+                    "Fair value of share class": result["class_value"][i],
+                    "Number of shares": breakpoints["shares"][i],
+                    "Fair value per share": result["fair_value_per_share"][i],
+                    "Issue price per share": breakpoints["issue_price"][i],
+                    "% change": result["change"][i],
+                    "Volatility for Each Class": result["class_volatility"][i],
+                    "DLOM (B/A)": result["dlom"][i],
+                }
+            )
+    except Exception as exc:
+        rows = [{}]
+        error = f"{type(exc).__name__}: {exc}"
+
+    seconds = time.perf_counter() - start
+    for row in rows:
+        row.update(
+            {
+                "Company": job.get("Company"),
+                "Valuation Date": job.get("Valuation Date"),
+                "Seconds": seconds,
+                "Error": error,
+            }
+        )
+    return rows
+
+
+def _value_companies(jobs):
+    return [row for job in jobs for row in _value_company(job)]
+
+
+def _error_rows(group, exc):
+    return [
+        {
+            "Company": job.get("Company"),
+            "Valuation Date": job.get("Valuation Date"),
+            "Error": f"{type(exc).__name__}: {exc}",
+        }
+        for job in group
+    ]
+
+
+def _run_groups(groups, indices, n_workers):
+    # Rows for every group that finished, plus the groups lost when a worker
+    # died; a dead worker breaks the whole pool, so those are all that were
+    # still pending at the time, not only the one that crashed
+    finished = {}
+    broken = []
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {}
+        for i in indices:
+            try:
+                futures[i] = executor.submit(_value_companies, groups[i])
+            except BrokenProcessPool:
+                broken.append(i)
+        for i, future in futures.items():
+            try:
+                finished[i] = future.result()
+            except BrokenProcessPool:
+                broken.append(i)
+            except Exception as exc:
+                finished[i] = _error_rows(groups[i], exc)
+    return finished, broken
+
+
+def opm_batch(jobs, n_workers=None, jobs_per_task=16):
+    # Values every job in a process pool and returns one tidy table with a
+    # row per company, date and security. Jobs are sent in small groups to
+    # keep pickling overhead down; failed jobs keep one row carrying the
+    # error. Groups lost to a dead worker are rerun in a fresh pool, and if
+    # a rerun makes no progress each group gets a pool of its own, so only
+    # the group that kills its worker is reported as failed
+    jobs = list(jobs)
+    if n_workers == 1:
+        return pd.DataFrame(_value_companies(jobs), columns=OPM_BATCH_COLUMNS)
+
+    groups = [
+        jobs[i : i + jobs_per_task] for i in range(0, len(jobs), jobs_per_task)
+    ]
+    results = {}
+    pending = list(range(len(groups)))
+    while pending:
+        finished, broken = _run_groups(groups, pending, n_workers)
+        results.update(finished)
+        if broken and not finished:
+            for i in broken:
+                finished, lost = _run_groups(groups, [i], 1)
+                results.update(finished)
+                if lost:
+                    results[i] = _error_rows(
+                        groups[i], BrokenProcessPool("worker process died")
+                    )
+            break
+        pending = broken
+
+    rows = [row for i in range(len(groups)) for row in results[i]]
+    return pd.DataFrame(rows, columns=OPM_BATCH_COLUMNS)
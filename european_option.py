@@ -1,44 +1,244 @@
+import time
+
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scipy.optimize import brentq
 from scipy.stats import norm
 import streamlit as st
 
 
-def black_scholes_dynamic_table(df):
-    def black_scholes(S, X, T, r, sigma):
-        d1 = (np.log(S / X) + (r + (sigma**2) / 2) * T) / (sigma * np.sqrt(T))
-        d2 = d1 - sigma * np.sqrt(T)
-        N_d1 = norm.cdf(d1)
-        N_d2 = norm.cdf(d2)
-        call_price = (S * N_d1) - (X * np.exp(-r * T) * N_d2)
-        return d1, d2, N_d1, N_d2, call_price
+def black_scholes(S, X, T, r, sigma, q=0):
+    # Merton form: a continuous dividend yield q discounts the spot leg.
+    # Works element-wise on scalars or whole NumPy columns
+    sigma_sqrt_T = sigma * np.sqrt(T)
+    d1 = (np.log(S / X) + (r - q + (sigma**2) / 2) * T) / sigma_sqrt_T
+    d2 = d1 - sigma_sqrt_T
+    N_d1 = norm.cdf(d1)
+    N_d2 = norm.cdf(d2)
+    call_price = (S * np.exp(-q * T) * N_d1) - (X * np.exp(-r * T) * N_d2)
+    return d1, d2, N_d1, N_d2, call_price
+
+
+def black_scholes_greeks(S, X, T, r, sigma, q=0, d1=None, d2=None):
+    # Call Greeks per unit move in spot, volatility and rate; theta is per
+    # year. Pass d1/d2 from black_scholes to avoid recomputing them
+    if d1 is None or d2 is None:
+        d1, d2 = black_scholes(S, X, T, r, sigma, q)[:2]
+    sqrt_T = np.sqrt(T)
+    spot_discount = np.exp(-q * T)
+    strike_discount = X * np.exp(-r * T)
+    pdf_d1 = norm.pdf(d1)
+    N_d1 = norm.cdf(d1)
+    N_d2 = norm.cdf(d2)
+
+    delta = spot_discount * N_d1
+    gamma = spot_discount * pdf_d1 / (S * sigma * sqrt_T)
+    vega = S * spot_discount * pdf_d1 * sqrt_T
+    theta = (
+        -S * spot_discount * pdf_d1 * sigma / (2 * sqrt_T)
+        + q * S * spot_discount * N_d1
+        - r * strike_discount * N_d2
+    )
+    rho = T * strike_discount * N_d2
+    return {"delta": delta, "gamma": gamma, "vega": vega, "theta": theta, "rho": rho}
+
+
+def _implied_volatility_guess(price, S, X, T, r, q):
+    # Corrado-Miller rational approximation on forward-discounted legs,
+    # clipped to a sane range so Newton starts inside the basin
+    spot = S * np.exp(-q * T)
+    strike = X * np.exp(-r * T)
+    half_moneyness = (spot - strike) / 2
+    excess = price - half_moneyness
+    root = np.sqrt(np.maximum(excess**2 - (spot - strike) ** 2 / np.pi, 0))
+    total_vol = np.sqrt(2 * np.pi) / (spot + strike) * (excess + root)
+    return np.clip(total_vol / np.sqrt(T), 1e-3, 5.0)
+
+
+def implied_volatility(
+    price, S, X, T, r, q=0, tolerance=1e-8, max_iterations=50,
+    lower=1e-6, upper=10.0,
+):
+    # Vectorized Newton on every contract at once; rows that stall, leave
+    # the bracket or have negligible vega are finished with Brent's method.
+    # Prices outside the no-arbitrage bounds return NaN
+    price, S, X, T, r, q = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in (price, S, X, T, r, q))
+    )
+    shape = price.shape
+    price, S, X, T, r, q = (
+        value.ravel() for value in (price, S, X, T, r, q)
+    )
+
+    lower_bound = np.maximum(S * np.exp(-q * T) - X * np.exp(-r * T), 0)
+    upper_bound = S * np.exp(-q * T)
+    valid = (price > lower_bound) & (price < upper_bound) & (T > 0)
 
+    sigma = np.full(price.shape, np.nan)
+    sigma[valid] = _implied_volatility_guess(
+        price[valid], S[valid], X[valid], T[valid], r[valid], q[valid]
+    )
+    active = valid.copy()
+    converged = np.zeros(price.shape, dtype=bool)
+
+    for _ in range(max_iterations):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        d1, d2, _, _, model = black_scholes(
+            S[idx], X[idx], T[idx], r[idx], sigma[idx], q[idx]
+        )
+        vega = S[idx] * np.exp(-q[idx] * T[idx]) * norm.pdf(d1) * np.sqrt(T[idx])
+        diff = model - price[idx]
+
+        done = np.abs(diff) < tolerance * np.maximum(price[idx], 1.0)
+        converged[idx[done]] = True
+        active[idx[done]] = False
+
+        step_rows = ~done
+        with np.errstate(divide="ignore", invalid="ignore"):
+            updated = sigma[idx] - diff / vega
+        stalled = step_rows & (
+            ~np.isfinite(updated) | (updated <= lower) | (updated >= upper)
+        )
+        active[idx[stalled]] = False
+        moving = step_rows & ~stalled
+        sigma[idx[moving]] = updated[moving]
+
+    # Brent fallback for everything Newton did not settle
+    for i in np.flatnonzero(valid & ~converged):
+        def objective(vol, i=i):
+            return black_scholes(S[i], X[i], T[i], r[i], vol, q[i])[-1] - price[i]
+
+        try:
+            sigma[i] = brentq(objective, lower, upper, xtol=1e-12)
+        except ValueError:
+            sigma[i] = np.nan
+
+    sigma = sigma.reshape(shape)
+    return float(sigma) if sigma.ndim == 0 else sigma
+
+
+def grant_table_inputs(df):
+    # Shared parsing of a grant table for every pricing engine: returns a copy
+    # with parsed dates and "Time to Maturity" in years, plus the model inputs
+    # as arrays. Rates, volatility and dividend yield are in percent; a
+    # missing or empty dividend yield counts as zero
+    df = df.copy()
     df["Grant Date"] = pd.to_datetime(df["Grant Date"])
     df["Vesting Date"] = pd.to_datetime(df["Vesting Date"])
-    df["Time to Maturity"] = (df["Vesting Date"] - df["Grant Date"]).dt.days + 1
-    df["Time to Maturity"] = df["Time to Maturity"] / 365
-
-    df["d1"] = np.nan
-    df["d2"] = np.nan
-    df["N(d1)"] = np.nan
-    df["N(d2)"] = np.nan
-    df["Mesop Value/ share"] = np.nan
-    df["Mesop Value"] = np.nan
-
-    for index, row in df.iterrows():
-        S = row["Spot Price (S)"]
-        X = row["Strike (X)"]
-        r = row["Risk free"] / 100
-        sigma = row["Volatility"] / 100
-        T = row["Time to Maturity"]
-
-        d1, d2, N_d1, N_d2, call_price = black_scholes(S, X, T, r, sigma)
-        df.at[index, "d1"] = d1
-        df.at[index, "d2"] = d2
-        df.at[index, "N(d1)"] = N_d1
-        df.at[index, "N(d2)"] = N_d2
-        df.at[index, "Mesop Value/ share"] = call_price
-        df.at[index, "Mesop Value"] = call_price * row["Number of shares"]
+    df["Time to Maturity"] = (
+        (df["Vesting Date"] - df["Grant Date"]).dt.days + 1
+    ) / 365
+
+    inputs = {
+        "S": df["Spot Price (S)"].to_numpy(dtype=float),
+        "X": df["Strike (X)"].to_numpy(dtype=float),
+        "T": df["Time to Maturity"].to_numpy(dtype=float),
+        "r": df["Risk free"].to_numpy(dtype=float) / 100,
+    }
+    if "Volatility" in df:
+        inputs["sigma"] = df["Volatility"].to_numpy(dtype=float) / 100
+    if "Dividend yield" in df:
+        inputs["q"] = df["Dividend yield"].fillna(0).to_numpy(dtype=float) / 100
+    else:
+        inputs["q"] = np.zeros(len(df))
+    return df, inputs
 
+
+def implied_volatility_table(df, price_column="Market Price"):
+    # Calibrates "Volatility" (in percent) for every contract from an
+    # observed per-share price, using the same columns as black_scholes_table
+    df, inputs = grant_table_inputs(df)
+    df["Volatility"] = 100 * implied_volatility(
+        df[price_column].to_numpy(dtype=float),
+        inputs["S"],
+        inputs["X"],
+        inputs["T"],
+        inputs["r"],
+        inputs["q"],
+    )
+    return df
+
+
+def black_scholes_table(df):
+    # Column-wise engine: every contract is priced in one pass over NumPy
+    # arrays. Rates, volatility and dividend yield are in percent
+    df, inputs = grant_table_inputs(df)
+    S, X, T, r, sigma, q = (inputs[name] for name in ("S", "X", "T", "r", "sigma", "q"))
+
+    d1, d2, N_d1, N_d2, call_price = black_scholes(S, X, T, r, sigma, q)
+    df["d1"] = d1
+    df["d2"] = d2
+    df["N(d1)"] = N_d1
+    df["N(d2)"] = N_d2
+    df["Mesop Value/ share"] = call_price
+    df["Mesop Value"] = call_price * df["Number of shares"].to_numpy(dtype=float)
+
+    greeks = black_scholes_greeks(S, X, T, r, sigma, q, d1=d1, d2=d2)
+    for name, values in greeks.items():
+        df[name.capitalize()] = values
+    return df
+
+
+def black_scholes_dynamic_table(df):
+    df = black_scholes_table(df)
     st.dataframe(df)
     return df
+
+
+STREAM_CHUNK_ROWS = 250_000
+
+
+def _read_grant_chunks(source, chunk_size):
+    # Yields DataFrames of at most chunk_size rows from a CSV or Parquet grant
+    # file (path or file-like upload) without loading the whole ledger
+    name = str(getattr(source, "name", source)).lower()
+    if name.endswith((".parquet", ".pq")):
+        parquet_file = pq.ParquetFile(source)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(source, chunksize=chunk_size)
+
+
+def black_scholes_stream(
+    source, destination, chunk_size=STREAM_CHUNK_ROWS, progress=None
+):
+    # Values a grant file chunk by chunk with black_scholes_table and appends
+    # each result to one Parquet file; memory is bounded by chunk_size.
+    # progress(rows, seconds) is called after every chunk
+    writer = None
+    rows = 0
+    chunks = 0
+    total_value = 0.0
+    start = time.perf_counter()
+    try:
+        for chunk in _read_grant_chunks(source, chunk_size):
+            valued = black_scholes_table(chunk)
+            table = pa.Table.from_pandas(valued, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(destination, table.schema)
+            else:
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+
+            rows += len(valued)
+            chunks += 1
+            total_value += float(np.nansum(valued["Mesop Value"].to_numpy()))
+            if progress is not None:
+                progress(rows, time.perf_counter() - start)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    seconds = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "chunks": chunks,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds > 0 else float("nan"),
+        "total_value": total_value,
+    }
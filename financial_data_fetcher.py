@@ -1,11 +1,31 @@
+import pandas as pd
 import yfinance as yf
+from market_data_cache import market_data_cache
 
 
-def get_financial_data(ticker):
-    stock = yf.Ticker(ticker)
+def get_financial_data(ticker, provider=yf.Ticker, cache=market_data_cache):
+    # Fundamentals are served from the shared market-data cache; pass
+    # cache=None to always hit the provider (e.g. with a local fake)
+    if cache is None:
+        return _fetch_financial_data(ticker, provider)
+    record = cache.get(
+        ticker,
+        "fundamentals",
+        "latest",
+        lambda: pd.DataFrame([_fetch_financial_data(ticker, provider)]),
+    ).iloc[0]
+    return {name: (None if pd.isna(value) else value) for name, value in record.items()}
+
+
+def _fetch_financial_data(ticker, provider):
+    # provider builds the ticker object (info, balance_sheet, financials);
+    # a local fake can stand in for yfinance
+    stock = provider(ticker)
 
     # Extract necessary information from the ticker
-    market_cap = stock.info.get("marketCap", None)
+    # info is read once; every attribute access can be a network request
+    info = stock.info
+    market_cap = info.get("marketCap", None)
     balance_sheet = stock.balance_sheet
 
     # Safely get 'Total Liabilities', 'Book Value Equity', and 'Total Debt' using iloc
@@ -24,9 +44,9 @@ def get_financial_data(ticker):
         if "Total Debt" in balance_sheet.index
         else None
     )
-    ltm_eps = stock.info.get("trailingEps", None)
-    price_share = stock.info.get("currentPrice", None)
-    volatility = stock.info.get("beta", None)
+    ltm_eps = info.get("trailingEps", None)
+    price_share = info.get("currentPrice", None)
+    volatility = info.get("beta", None)
 
     # Extract LTM Revenue and EBITDA using iloc
     financials = stock.financials
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+# Shared cache for market data keyed by (ticker, dataset, period). Frames are
+# kept as Parquet on local disk with a per-dataset TTL and fronted by an
+# in-process LRU, so repeat valuations do not touch the network
+CACHE_DIR = os.environ.get(
+    "MARKET_DATA_CACHE_DIR", os.path.expanduser("~/.cache/market_data")
+)
+
+# Seconds before an entry is refetched: prices go stale intraday,
+# fundamentals only change with new filings
+DATASET_TTLS = {
+    "prices": 15 * 60,
+    "fundamentals": 24 * 60 * 60,
+}
+DEFAULT_TTL = 60 * 60
+
+
+class MarketDataCache:
+    def __init__(self, directory=CACHE_DIR, ttls=None, memory_items=128):
+        self.directory = directory
+        self.ttls = {**DATASET_TTLS, **(ttls or {})}
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, f"{key[1]}-{digest}.parquet")
+
+    def _count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def _remember(self, key, stored_at, frame):
+        with self.lock:
+            self.memory[key] = (stored_at, frame)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_items:
+                self.memory.popitem(last=False)
+
+    def get(self, ticker, dataset, period, fetch):
+        # fetch() is only called on a miss and must return a DataFrame
+        key = (ticker, dataset, period)
+        ttl = self.ttls.get(dataset, DEFAULT_TTL)
+        now = time.time()
+
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and now - entry[0] < ttl:
+                self.memory.move_to_end(key)
+                self.counts["memory_hits"] += 1
+                return entry[1].copy()
+
+        path = self._path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+        except OSError:
+            stored_at = None
+        if stored_at is not None and now - stored_at < ttl:
+            try:
+                frame = pd.read_parquet(path)
+            except Exception:
+                frame = None
+            if frame is not None:
+                self._count("disk_hits")
+                self._remember(key, stored_at, frame)
+                return frame.copy()
+
+        self._count("misses")
+        frame = fetch()
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first so readers never see half a file
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            frame.to_parquet(temporary)
+            os.replace(temporary, path)
+        except Exception:
+            # Frames Parquet cannot hold are still served from memory
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        self._remember(key, now, frame)
+        return frame.copy()
+
+    def clear(self, dataset=None):
+        # Drops one dataset (or everything) from memory and disk
+        with self.lock:
+            for key in [key for key in self.memory if dataset in (None, key[1])]:
+                del self.memory[key]
+        if os.path.isdir(self.directory):
+            prefix = "" if dataset is None else f"{dataset}-"
+            for name in os.listdir(self.directory):
+                if name.startswith(prefix) and name.endswith(".parquet"):
+                    os.remove(os.path.join(self.directory, name))
+
+    def metrics(self):
+        with self.lock:
+            counts = dict(self.counts)
+            counts["memory_items"] = len(self.memory)
+        lookups = counts["memory_hits"] + counts["disk_hits"] + counts["misses"]
+        hits = counts["memory_hits"] + counts["disk_hits"]
+        counts["hit_rate"] = hits / lookups if lookups else 0.0
+        return counts
+
+
+market_data_cache = MarketDataCache()
@@ -1,8 +1,569 @@
+import copy
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
 import yfinance as yf
 import streamlit as st
+from scipy.stats import norm, qmc
+from european_option import black_scholes
+from market_data_cache import market_data_cache
+
+
+# Upper bound on the number of normal draws held in memory per portfolio chunk
+PORTFOLIO_CHUNK_ELEMENTS = 2**22
+
+
+def simulate_portfolio_paths(
+    meanReturns,
+    covMatrix,
+    weights,
+    mc_sims,
+    T,
+    initial_portfolio,
+    chunk_size=None,
+    n_workers=1,
+    seed=None,
+    rng=None,
+):
+    if n_workers > 1:
+        # Split simulations across processes, each with its own spawned stream;
+        # columns are stitched back in worker order
+        seed_sequences = np.random.SeedSequence(seed).spawn(n_workers)
+        worker_sims = [len(s) for s in np.array_split(np.arange(mc_sims), n_workers)]
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            blocks = list(
+                executor.map(
+                    _portfolio_worker,
+                    [
+                        (meanReturns, covMatrix, weights, sims, T, initial_portfolio, chunk_size)
+                        for sims in worker_sims
+                    ],
+                    seed_sequences,
+                )
+            )
+        return np.hstack(blocks)
+
+    rng = np.random.default_rng(seed) if rng is None else rng
+    meanReturns = np.asarray(meanReturns, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+
+    # Factor the covariance once; every simulation shares the same L
+    L = np.linalg.cholesky(np.asarray(covMatrix, dtype=float))
+
+    # w . (mu + L z) = w . mu + (L^T w) . z, and (L^T w) . z is exactly
+    # N(0, |L^T w|^2), so one normal per simulated day carries the whole
+    # correlated draw and no (sims x T x assets) tensor is ever needed
+    portfolio_mean = weights @ meanReturns
+    portfolio_volatility = np.linalg.norm(L.T @ weights)
+
+    if chunk_size is None:
+        chunk_size = max(1, PORTFOLIO_CHUNK_ELEMENTS // T)
+
+    portfolio_sims = np.empty((mc_sims, T))
+    for start in range(0, mc_sims, chunk_size):
+        stop = min(start + chunk_size, mc_sims)
+        Z = rng.standard_normal(size=(stop - start, T))
+        portfolio_returns = portfolio_mean + portfolio_volatility * Z
+        portfolio_sims[start:stop] = (
+            np.cumprod(portfolio_returns + 1, axis=1) * initial_portfolio
+        )
+
+    # Days along the rows, one column per simulation
+    return portfolio_sims.T
+
+
+def portfolio_fan_bands(portfolio_sims, percentiles=(5, 25, 50, 75, 95)):
+    # Percentiles across simulations for each day, keyed by percentile
+    values = np.percentile(portfolio_sims, percentiles, axis=1)
+    return dict(zip(percentiles, values))
+
+
+def _portfolio_worker(args, seed_sequence):
+    return simulate_portfolio_paths(*args, rng=np.random.default_rng(seed_sequence))
+
+
+# Upper bound on the number of normal draws held in memory per option chunk
+OPTION_CHUNK_ELEMENTS = 2**22
+
+
+VARIANCE_REDUCTION_METHODS = (None, "antithetic", "control_variate", "moment_matching")
+
+
+def _payoff_moments(samples):
+    # samples is (paths x columns); m2 holds the co-moment matrix of the columns
+    mean = np.mean(samples, axis=0)
+    centered = samples - mean
+    return {"count": len(samples), "mean": mean, "m2": centered.T @ centered}
+
+
+def _column_moments(samples):
+    # Like _payoff_moments but only the diagonal of m2, for wide samples
+    mean = np.mean(samples, axis=0)
+    m2 = np.sum((samples - mean) ** 2, axis=0)
+    return {"count": len(samples), "mean": mean, "m2": m2}
+
+
+def _merge_moments(a, b):
+    # Chan et al. pairwise update, so chunked sums match a single pass
+    if a is None:
+        return b
+    count = a["count"] + b["count"]
+    delta = b["mean"] - a["mean"]
+    mean = a["mean"] + delta * b["count"] / count
+    spread = np.outer(delta, delta) if np.ndim(a["m2"]) == 2 else delta**2
+    m2 = a["m2"] + b["m2"] + spread * a["count"] * b["count"] / count
+    return {"count": count, "mean": mean, "m2": m2}
+
+
+def _payoff_bin_edges(S, K, T, r, sigma, nbins):
+    # Fixed edges known before any path is drawn, so chunk counts can be summed;
+    # the upper edge sits three standard deviations out in the terminal log-price
+    upper = S * np.exp((r - 0.5 * sigma**2) * T + 3 * sigma * np.sqrt(T)) - K
+    # Puts are bounded by the strike
+    return np.linspace(0, max(upper, K, 1e-8), nbins + 1)
+
+
+# Payoffs read the (paths x steps + 1) price tensor whose first column is S_0,
+# so each one is a single vectorized reduction over the shared paths
+def call_payoff(paths, K, barrier=None):
+    return np.maximum(0, paths[:, -1] - K)
+
+
+def put_payoff(paths, K, barrier=None):
+    return np.maximum(0, K - paths[:, -1])
+
+
+def asian_arithmetic_call_payoff(paths, K, barrier=None):
+    return np.maximum(0, paths[:, 1:].mean(axis=1) - K)
+
+
+def asian_arithmetic_put_payoff(paths, K, barrier=None):
+    return np.maximum(0, K - paths[:, 1:].mean(axis=1))
+
+
+def asian_geometric_call_payoff(paths, K, barrier=None):
+    return np.maximum(0, np.exp(np.log(paths[:, 1:]).mean(axis=1)) - K)
+
+
+def asian_geometric_put_payoff(paths, K, barrier=None):
+    return np.maximum(0, K - np.exp(np.log(paths[:, 1:]).mean(axis=1)))
+
+
+def lookback_fixed_call_payoff(paths, K, barrier=None):
+    return np.maximum(0, paths.max(axis=1) - K)
+
+
+def lookback_fixed_put_payoff(paths, K, barrier=None):
+    return np.maximum(0, K - paths.min(axis=1))
+
+
+def lookback_floating_call_payoff(paths, K, barrier=None):
+    return paths[:, -1] - paths.min(axis=1)
+
+
+def lookback_floating_put_payoff(paths, K, barrier=None):
+    return paths.max(axis=1) - paths[:, -1]
+
+
+def _barrier_payoff(vanilla, direction, knock):
+    # Barriers are monitored discretely on the simulation grid
+    def payoff(paths, K, barrier=None):
+        if barrier is None:
+            raise ValueError("Barrier payoffs need a barrier level")
+        if direction == "up":
+            hit = paths.max(axis=1) >= barrier
+        else:
+            hit = paths.min(axis=1) <= barrier
+        alive = hit if knock == "in" else ~hit
+        return np.where(alive, vanilla(paths, K), 0.0)
+
+    return payoff
+
+
+# Path-independent payoffs only need the last column, which lets the engine
+# sample S_T in a single step
+PAYOFFS = {
+    "call": {"payoff": call_payoff, "path_dependent": False},
+    "put": {"payoff": put_payoff, "path_dependent": False},
+    "asian_arithmetic_call": {
+        "payoff": asian_arithmetic_call_payoff,
+        "path_dependent": True,
+    },
+    "asian_arithmetic_put": {
+        "payoff": asian_arithmetic_put_payoff,
+        "path_dependent": True,
+    },
+    "asian_geometric_call": {
+        "payoff": asian_geometric_call_payoff,
+        "path_dependent": True,
+    },
+    "asian_geometric_put": {
+        "payoff": asian_geometric_put_payoff,
+        "path_dependent": True,
+    },
+    "lookback_fixed_call": {
+        "payoff": lookback_fixed_call_payoff,
+        "path_dependent": True,
+    },
+    "lookback_fixed_put": {
+        "payoff": lookback_fixed_put_payoff,
+        "path_dependent": True,
+    },
+    "lookback_floating_call": {
+        "payoff": lookback_floating_call_payoff,
+        "path_dependent": True,
+    },
+    "lookback_floating_put": {
+        "payoff": lookback_floating_put_payoff,
+        "path_dependent": True,
+    },
+}
+for _direction in ("up", "down"):
+    for _knock in ("in", "out"):
+        for _name, _vanilla in (("call", call_payoff), ("put", put_payoff)):
+            PAYOFFS[f"{_direction}_and_{_knock}_{_name}"] = {
+                "payoff": _barrier_payoff(_vanilla, _direction, _knock),
+                "path_dependent": True,
+            }
+
+
+def _brownian_bridge_schedule(n):
+    # Breadth-first midpoints, so the leading coordinates fix the coarse shape
+    # of the path and the terminal value uses the very first one
+    schedule = []
+    queue = [(0, n)]
+    while queue:
+        left, right = queue.pop(0)
+        if right - left < 2:
+            continue
+        mid = (left + right) // 2
+        schedule.append((mid, left, right))
+        queue += [(left, mid), (mid, right)]
+    return schedule
+
+
+def _brownian_bridge(Z, schedule):
+    # Map (paths x steps) normals to standard normal increments of a path
+    # built by Brownian-bridge refinement
+    m, n = Z.shape
+    W = np.zeros((m, n + 1))
+    W[:, n] = np.sqrt(n) * Z[:, 0]
+    for k, (mid, left, right) in enumerate(schedule, start=1):
+        W[:, mid] = (
+            (right - mid) * W[:, left] + (mid - left) * W[:, right]
+        ) / (right - left) + np.sqrt((mid - left) * (right - mid) / (right - left)) * Z[
+            :, k
+        ]
+    return np.diff(W, axis=1)
+
+
+def pseudo_random_sampler(n, rng):
+    def draw(m):
+        return rng.standard_normal(size=(m, n))
+
+    return draw
+
+
+def _qmc_sampler(engine):
+    def sampler(n, rng):
+        # A fresh scramble per call, so each batch is an independent replication
+        qmc_engine = engine(d=n, scramble=True, seed=rng)
+        schedule = _brownian_bridge_schedule(n)
+
+        # Chunks continue the same sequence, so only the first draw of a batch
+        # is checked for Sobol' balance
+        def draw(m):
+            U = qmc_engine.random(m)
+            Z = norm.ppf(np.clip(U, 1e-12, 1 - 1e-12))
+            return _brownian_bridge(Z, schedule)
+
+        return draw
+
+    return sampler
+
+
+# A sampler takes (steps, rng) and returns draw(m) -> (m x steps) normal increments
+SAMPLERS = {
+    "pseudo": pseudo_random_sampler,
+    "sobol": _qmc_sampler(qmc.Sobol),
+    "halton": _qmc_sampler(qmc.Halton),
+}
+
+
+def _simulate_option_batches(params, batch_sizes, rng):
+    # Simulate whole batches and return their raw accumulators, so the results
+    # of several workers can be reduced exactly afterwards
+    sampler = params["sampler"]
+    if not callable(sampler):
+        sampler = SAMPLERS[sampler]
+    payoff_fns = [PAYOFFS[name]["payoff"] for name in params["payoff_types"]]
+    barrier = params["barrier"]
+    variance_reduction = params["variance_reduction"]
+    antithetic = variance_reduction == "antithetic"
+    moment_matching = variance_reduction == "moment_matching"
+    K = params["K"]
+    steps = params["steps"]
+    bin_edges = params["bin_edges"]
+
+    dt = params["T"] / steps
+    nudt = (params["r"] - 0.5 * params["sigma"] ** 2) * dt
+    volsdt = params["sigma"] * np.sqrt(dt)
+    lnS = np.log(params["S"])
+
+    counts = np.zeros(len(bin_edges) - 1, dtype=np.int64)
+    path_moments = None
+    unit_moments = None
+    batch_means = []
+
+    for batch_size in batch_sizes:
+        batch_moments = None
+        standardize = None
+        if moment_matching and batch_size > params["chunk_units"]:
+            # A streamed batch is standardized with the moments of the whole
+            # batch, taken in a first pass over the same draws from a copy of
+            # the generator, so it matches the in-memory estimator
+            draw = sampler(steps, copy.deepcopy(rng))
+            z_moments = None
+            for start in range(0, batch_size, params["chunk_units"]):
+                Z = draw(min(params["chunk_units"], batch_size - start))
+                z_moments = _merge_moments(z_moments, _column_moments(Z))
+            standardize = (z_moments["mean"], np.sqrt(z_moments["m2"] / batch_size))
+
+        draw = sampler(steps, rng)
+        for start in range(0, batch_size, params["chunk_units"]):
+            u = min(params["chunk_units"], batch_size - start)
+            Z = draw(u)
+            if antithetic:
+                Z = np.concatenate([Z, -Z])
+            if standardize is not None:
+                Z = (Z - standardize[0]) / standardize[1]
+            elif moment_matching and len(Z) > 1:
+                Z = (Z - Z.mean(axis=0)) / Z.std(axis=0)
+
+            log_paths = np.empty((len(Z), steps + 1))
+            log_paths[:, 0] = lnS
+            np.cumsum(nudt + volsdt * Z, axis=1, out=log_paths[:, 1:])
+            log_paths[:, 1:] += lnS
+            paths = np.exp(log_paths)
+            ST = paths[:, -1]
+            # One column per payoff, all read off the same simulated paths
+            payoff = np.column_stack([fn(paths, K, barrier) for fn in payoff_fns])
+
+            path_moments = _merge_moments(path_moments, _payoff_moments(payoff))
+            # Payoffs beyond the last edge are folded into the top bin
+            counts += np.histogram(
+                np.minimum(payoff[:, 0], bin_edges[-1]), bins=bin_edges
+            )[0]
+
+            samples = payoff
+            if variance_reduction == "control_variate":
+                # The vanilla call has a Black-Scholes closed form; for the vanilla
+                # call itself the control is perfect and the error collapses to zero
+                control = np.maximum(0, ST - K)
+                samples = np.column_stack([payoff, control])
+            if antithetic:
+                samples = (samples[:u] + samples[u:]) / 2
+            batch_moments = _merge_moments(batch_moments, _payoff_moments(samples))
+
+        batch_means.append(batch_moments["mean"])
+        unit_moments = _merge_moments(unit_moments, batch_moments)
+
+    return {
+        "path_moments": path_moments,
+        "unit_moments": unit_moments,
+        "batch_means": batch_means,
+        "counts": counts,
+    }
+
+
+def _option_worker(params, batch_sizes, seed_sequence):
+    return _simulate_option_batches(
+        params, batch_sizes, np.random.default_rng(seed_sequence)
+    )
+
+
+def _merge_option_batches(a, b):
+    return {
+        "path_moments": _merge_moments(a["path_moments"], b["path_moments"]),
+        "unit_moments": _merge_moments(a["unit_moments"], b["unit_moments"]),
+        "batch_means": a["batch_means"] + b["batch_means"],
+        "counts": a["counts"] + b["counts"],
+    }
+
+
+def simulate_option_price(
+    S,
+    K,
+    T,
+    r,
+    sigma,
+    n,
+    M,
+    payoff_type="call",
+    barrier=None,
+    variance_reduction=None,
+    sampler="pseudo",
+    batches=None,
+    streaming=False,
+    chunk_size=None,
+    nbins=50,
+    n_workers=1,
+    seed=None,
+    rng=None,
+):
+    if variance_reduction not in VARIANCE_REDUCTION_METHODS:
+        raise ValueError(f"Unknown variance reduction method: {variance_reduction}")
+    quasi_random = sampler in ("sobol", "halton")
+    # A list of payoffs is priced as a book from one shared set of paths
+    payoff_types = [payoff_type] if isinstance(payoff_type, str) else list(payoff_type)
+    n_payoffs = len(payoff_types)
+
+    # GBM log-increments are exact, so European payoffs draw S_T in one step
+    # and only path-dependent payoffs pay for the full time grid
+    path_dependent = any(PAYOFFS[name]["path_dependent"] for name in payoff_types)
+    steps = n if path_dependent else 1
+
+    # An antithetic pair is one independent sample; every other method samples paths
+    antithetic = variance_reduction == "antithetic"
+    paths_per_unit = 2 if antithetic else 1
+    units = max(1, M // paths_per_unit)
+
+    # Moment matching and QMC couple the paths of a batch, so their error comes
+    # from the spread of independent batch estimates (randomized replications)
+    batch_error = quasi_random or variance_reduction == "moment_matching"
+    if batches is None:
+        batches = 16 if quasi_random else 10 if batch_error else 1
+    # Each worker needs at least one whole batch; with fewer units than
+    # workers the extra workers are dropped rather than left empty
+    batches = min(max(batches, n_workers), units)
+    n_workers = min(n_workers, batches)
+    if sampler == "sobol":
+        # Scrambled Sobol' points only balance in powers of two, so each
+        # replication is rounded down to one; the paths used are reported
+        units = batches * 2 ** int(np.log2(units // batches))
+    batch_sizes = np.full(batches, units // batches)
+    batch_sizes[: units % batches] += 1
+
+    # Paths are drawn path-major, so the same seed yields the same paths
+    # whether they come in one block or in many chunks
+    if not streaming:
+        chunk_units = units
+    else:
+        if chunk_size is None:
+            chunk_size = OPTION_CHUNK_ELEMENTS // steps
+        chunk_units = max(1, chunk_size // paths_per_unit)
+        if sampler == "sobol":
+            # Keeps the first chunk of every replication a power of two too
+            chunk_units = 2 ** int(np.log2(chunk_units))
+
+    params = {
+        "S": S,
+        "K": K,
+        "T": T,
+        "r": r,
+        "sigma": sigma,
+        "steps": steps,
+        "payoff_types": payoff_types,
+        "barrier": barrier,
+        "variance_reduction": variance_reduction,
+        "sampler": sampler,
+        "chunk_units": chunk_units,
+        "bin_edges": _payoff_bin_edges(S, K, T, r, sigma, nbins),
+    }
+
+    if n_workers > 1:
+        # One spawned stream per worker and a fixed reduction order make the
+        # result bit-reproducible for a given seed and worker count
+        seed_sequences = np.random.SeedSequence(seed).spawn(n_workers)
+        worker_batches = np.array_split(batch_sizes, n_workers)
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            partials = list(
+                executor.map(
+                    _option_worker,
+                    [params] * n_workers,
+                    worker_batches,
+                    seed_sequences,
+                )
+            )
+        accumulated = partials[0]
+        for partial in partials[1:]:
+            accumulated = _merge_option_batches(accumulated, partial)
+    else:
+        rng = np.random.default_rng(seed) if rng is None else rng
+        accumulated = _simulate_option_batches(params, batch_sizes, rng)
+
+    # Undiscounted Black-Scholes call value, the known mean of the control payoff
+    control_mean = np.exp(r * T) * black_scholes(S, K, T, r, sigma)[-1]
+
+    unit_moments = accumulated["unit_moments"]
+    path_moments = accumulated["path_moments"]
+    batch_means = np.array(accumulated["batch_means"])
+    means = unit_moments["mean"][:n_payoffs]
+    cov = unit_moments["m2"] / units
+    variances = np.diag(cov)[:n_payoffs]
+    batch_estimates = batch_means[:, :n_payoffs]
+    if variance_reduction == "control_variate":
+        # The control sits in the last column; each payoff gets its own beta
+        control_variance = cov[n_payoffs, n_payoffs]
+        if control_variance > 0:
+            beta = cov[:n_payoffs, n_payoffs] / control_variance
+        else:
+            beta = np.zeros(n_payoffs)
+        means = means - beta * (unit_moments["mean"][n_payoffs] - control_mean)
+        variances = np.maximum(variances - beta * cov[:n_payoffs, n_payoffs], 0.0)
+        batch_estimates = batch_estimates - np.outer(
+            batch_means[:, n_payoffs] - control_mean, beta
+        )
+
+    if batch_error and batches > 1:
+        std_errors = np.std(batch_estimates, axis=0, ddof=1) / np.sqrt(batches)
+    else:
+        std_errors = np.sqrt(variances / units)
+
+    # Variance of a plain estimator over the same number of paths, relative to
+    # the variance actually achieved
+    plain_variances = np.diag(path_moments["m2"]) / path_moments["count"] ** 2
+    vr_factors = np.divide(
+        plain_variances,
+        std_errors**2,
+        out=np.full(n_payoffs, np.inf),
+        where=std_errors > 0,
+    )
+    prices = np.exp(-r * T) * means
+
+    result = {
+        "price": prices[0],
+        "std_error": std_errors[0],
+        "vr_factor": vr_factors[0],
+        "book": pd.DataFrame(
+            {"Price": prices, "Std Error": std_errors, "VR Factor": vr_factors},
+            index=payoff_types,
+        ),
+        "counts": accumulated["counts"],
+        "bin_edges": params["bin_edges"],
+        "paths": units * paths_per_unit,
+    }
+
+    return result
+
+
+def get_data(stocks, start, end, cache=market_data_cache):
+    # Adjusted closes come from the shared market-data cache when given
+    def download():
+        prices = yf.download(stocks, start=start, end=end)["Adj Close"]
+        return prices.to_frame() if isinstance(prices, pd.Series) else prices
+
+    if cache is None:
+        stockData = download()
+    else:
+        key = stocks if isinstance(stocks, str) else ",".join(stocks)
+        stockData = cache.get(key, "prices", f"{start}:{end}", download)
+    returns = stockData.pct_change()
+    meanReturns = returns.mean()
+    covMatrix = returns.cov()
+    covMatrix += np.eye(covMatrix.shape[0]) * 1e-10
+    return meanReturns, covMatrix
 
 
 def monte_carlo_simulation(simulation_type, **kwargs):
@@ -13,14 +574,6 @@ def monte_carlo_simulation(simulation_type, **kwargs):
         belowVaR = returns <= mcVaR(returns, alpha)
         return returns[belowVaR].mean()
 
-    def get_data(stocks, start, end):
-        stockData = yf.download(stocks, start=start, end=end)["Adj Close"]
-        returns = stockData.pct_change()
-        meanReturns = returns.mean()
-        covMatrix = returns.cov()
-        covMatrix += np.eye(covMatrix.shape[0]) * 1e-10
-        return meanReturns, covMatrix
-
     if simulation_type == "option":
         S = kwargs["S"]
         K = kwargs["K"]
@@ -30,22 +583,49 @@ def monte_carlo_simulation(simulation_type, **kwargs):
         n = kwargs.get("n", int(T * 12))
         M = kwargs.get("M", 10000)
 
-        dt = T / n
-        nudt = (r - 0.5 * sigma**2) * dt
-        volsdt = sigma * np.sqrt(dt)
-        lnS = np.log(S)
-        Z = np.random.normal(size=(n, M))
-        delta_lnSt = nudt + volsdt * Z
-        lnSt = lnS + np.cumsum(delta_lnSt, axis=0)
-        ST = np.exp(lnSt[-1])
-        payoff = np.maximum(0, ST - K)
-        option_price = np.exp(-r * T) * np.mean(payoff)
-        std_error = np.std(payoff) / np.sqrt(M)
+        payoff_type = kwargs.get("payoff_type", "call")
+        barrier = kwargs.get("barrier", None)
+        variance_reduction = kwargs.get("variance_reduction", None)
+        sampler = kwargs.get("sampler", "pseudo")
+        streaming = kwargs.get("streaming", False)
+        chunk_size = kwargs.get("chunk_size", None)
+        n_workers = kwargs.get("n_workers", 1)
+        seed = kwargs.get("seed", None)
+
+        result = simulate_option_price(
+            S,
+            K,
+            T,
+            r,
+            sigma,
+            n,
+            M,
+            payoff_type=payoff_type,
+            barrier=barrier,
+            variance_reduction=variance_reduction,
+            sampler=sampler,
+            streaming=streaming,
+            chunk_size=chunk_size,
+            n_workers=n_workers,
+            seed=seed,
+        )
+        option_price = result["price"]
+        std_error = result["std_error"]
+        if result["paths"] != M:
+            st.write(
+                f"Simulated {result['paths']:,} paths "
+                "(Sobol' replications are rounded down to powers of two)"
+            )
 
+        # Only the binned counts go to the browser, whatever the number of paths
+        edges = result["bin_edges"]
         fig = go.Figure()
         fig.add_trace(
-            go.Histogram(
-                x=payoff, nbinsx=50, histnorm="probability", name="Payoff Distribution"
+            go.Bar(
+                x=(edges[:-1] + edges[1:]) / 2,
+                y=result["counts"] / result["counts"].sum(),
+                width=np.diff(edges),
+                name="Payoff Distribution",
             )
         )
         fig.update_layout(
@@ -57,6 +637,16 @@ def monte_carlo_simulation(simulation_type, **kwargs):
         )
         st.plotly_chart(fig)
 
+        if len(result["book"]) > 1:
+            st.subheader("Priced Book")
+            st.dataframe(result["book"], use_container_width=True)
+
+        if variance_reduction is not None:
+            if np.isfinite(result["vr_factor"]):
+                st.write(f"Variance Reduction Factor: {result['vr_factor']:.2f}x")
+            else:
+                st.write("Variance Reduction Factor: exact (zero residual variance)")
+
         return option_price, std_error
 
     elif simulation_type == "portfolio":
@@ -67,37 +657,67 @@ def monte_carlo_simulation(simulation_type, **kwargs):
         T = kwargs.get("T", 100)
         initial_portfolio = kwargs.get("initial_portfolio", 10000)
 
+        seed = kwargs.get("seed", None)
+        chunk_size = kwargs.get("chunk_size", None)
+        n_workers = kwargs.get("n_workers", 1)
+
+        rng = np.random.default_rng(seed)
         meanReturns, covMatrix = get_data(stocks, start_date, end_date)
-        weights = np.random.random(len(meanReturns))
+        weights = rng.random(len(meanReturns))
         weights /= np.sum(weights)
-        meanM = np.full(shape=(T, len(weights)), fill_value=meanReturns)
-        meanM = meanM.T
-        portfolio_sims = np.full(shape=(T, mc_sims), fill_value=0.0)
-
-        for m in range(mc_sims):
-            Z = np.random.normal(size=(T, len(weights)))
-            L = np.linalg.cholesky(covMatrix)
-            daily_returns = meanM + np.inner(L, Z)
-            portfolio_sims[:, m] = (
-                np.cumprod(np.inner(weights, daily_returns.T) + 1) * initial_portfolio
-            )
+        portfolio_sims = simulate_portfolio_paths(
+            meanReturns,
+            covMatrix,
+            weights,
+            mc_sims,
+            T,
+            initial_portfolio,
+            chunk_size=chunk_size,
+            n_workers=n_workers,
+            seed=seed,
+            rng=rng,
+        )
 
+        # A fan of percentile bands replaces one trace per simulation
+        bands = portfolio_fan_bands(portfolio_sims)
+        days = np.arange(0, portfolio_sims.shape[0])
         fig = go.Figure()
-        for i in range(portfolio_sims.shape[1]):
+        for lower, upper, opacity in ((5, 95, 0.2), (25, 75, 0.4)):
             fig.add_trace(
                 go.Scatter(
-                    x=np.arange(0, portfolio_sims.shape[0]),
-                    y=portfolio_sims[:, i],
+                    x=days,
+                    y=bands[upper],
                     mode="lines",
-                    line=dict(width=1),
+                    line=dict(width=0),
                     showlegend=False,
+                    hoverinfo="skip",
                 )
             )
+            fig.add_trace(
+                go.Scatter(
+                    x=days,
+                    y=bands[lower],
+                    mode="lines",
+                    line=dict(width=0),
+                    fill="tonexty",
+                    fillcolor=f"rgba(31, 119, 180, {opacity})",
+                    name=f"P{lower}-P{upper}",
+                )
+            )
+        fig.add_trace(
+            go.Scatter(
+                x=days,
+                y=bands[50],
+                mode="lines",
+                line=dict(width=2, color="rgb(31, 119, 180)"),
+                name="Median",
+            )
+        )
         fig.update_layout(
             title=f"Monte Carlo Simulation of a Stock Portfolio ({', '.join(stocks)})",
             xaxis_title="Days",
             yaxis_title="Portfolio Value ($)",
-            showlegend=False,
+            showlegend=True,
         )
         st.plotly_chart(fig)
 
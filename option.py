@@ -1,12 +1,44 @@
+import os
+import tempfile
+
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-from american_option import binomial_tree_pricing
-from european_option import black_scholes_dynamic_table
-from monte_carlo import monte_carlo_simulation
+from american_option import binomial_tree_batch, binomial_tree_pricing
+from european_option import (
+    STREAM_CHUNK_ROWS,
+    black_scholes_dynamic_table,
+    black_scholes_stream,
+)
+from monte_carlo import PAYOFFS, monte_carlo_simulation
 from sidebar import render_page_based_on_sidebar
 
 
+# Sample grant ledger shared by the European and American batch tables
+DEFAULT_GRANTS = {
+    "Strike (X)": [450, 450, 450, 450, 1500],
+    "Spot Price (S)": [400, 400, 400, 400, 2100],
+    "Risk free": [5.8, 5.9, 6.0, 6.1, 5.83],
+    "Volatility": [53.9, 53.9, 53.9, 53.9, 34.64],
+    "Dividend yield": [0.0, 0.0, 0.0, 0.0, 0.0],
+    "Number of shares": [20124910, 20124910, 20124910, 20124910, 20124910],
+    "Grant Date": [
+        "5/15/2023",
+        "5/15/2023",
+        "5/15/2023",
+        "5/15/2023",
+        "5/15/2023",
+    ],
+    "Vesting Date": [
+        "5/19/2023",
+        "5/17/2024",
+        "5/16/2025",
+        "5/16/2026",
+        "5/15/2025",
+    ],
+}
+
+
 def option_page():
     st.title("Option Valuation")
     option_type = st.selectbox(
@@ -16,29 +48,7 @@ def option_page():
     render_page_based_on_sidebar()
 
     if option_type == "European":
-        data = {
-            "Strike (X)": [450, 450, 450, 450, 1500],
-            "Spot Price (S)": [400, 400, 400, 400, 2100],
-            "Risk free": [5.8, 5.9, 6.0, 6.1, 5.83],
-            "Volatility": [53.9, 53.9, 53.9, 53.9, 34.64],
-            "Dividend yield": [0.0, 0.0, 0.0, 0.0, 0.0],
-            "Number of shares": [20124910, 20124910, 20124910, 20124910, 20124910],
-            "Grant Date": [
-                "5/15/2023",
-                "5/15/2023",
-                "5/15/2023",
-                "5/15/2023",
-                "5/15/2023",
-            ],
-            "Vesting Date": [
-                "5/19/2023",
-                "5/17/2024",
-                "5/16/2025",
-                "5/16/2026",
-                "5/15/2025",
-            ],
-        }
-        df_bs = pd.DataFrame(data)
+        df_bs = pd.DataFrame(DEFAULT_GRANTS)
         if "df_bs" not in st.session_state:
             st.session_state.df_bs = df_bs
         st.subheader("Interactive Black-Scholes Input")
@@ -48,21 +58,92 @@ def option_page():
         if st.button("Calculate"):
             black_scholes_dynamic_table(st.session_state.df_bs)
 
-    elif option_type == "American":
-        S = st.number_input(
-            "Asset Value at Valuation Date (S)", value=2100.0, min_value=0.0
-        )
-        K = st.number_input("Strike Price (K)", value=1500.0, min_value=0.0)
-        T = st.number_input("Maturity in Years (T)", value=2.0, min_value=0.1)
-        r = st.number_input(
-            "Risk-free Rate (r)", value=0.0583, min_value=0.0, format="%.4f"
+        # Large uploaded ledgers are streamed in chunks straight to Parquet
+        # instead of going through the editor
+        st.subheader("Batch Grant File")
+        grant_source = st.file_uploader(
+            "Upload a grant file (CSV or Parquet)", type=["csv", "parquet"]
         )
-        sigma = st.number_input(
-            "Yearly Volatility (sigma)", value=0.3464, min_value=0.0, format="%.4f"
+        chunk_size = st.number_input(
+            "Rows per chunk", value=STREAM_CHUNK_ROWS, min_value=1000, step=1000
         )
-        steps = T * 12
-        if st.button("Calculate and Plot"):
-            binomial_tree_pricing(S, K, T, r, sigma, int(steps))
+        if grant_source and st.button("Value grant file"):
+            counter = st.empty()
+
+            def show_throughput(rows, seconds):
+                counter.write(
+                    f"{rows:,} rows valued ({rows / max(seconds, 1e-9):,.0f} rows/s)"
+                )
+
+            # The results only live long enough to be handed to the download
+            # button, so nothing is left behind in the temp directory
+            with tempfile.TemporaryDirectory() as directory:
+                destination = os.path.join(directory, "black_scholes_results.parquet")
+                try:
+                    stats = black_scholes_stream(
+                        grant_source,
+                        destination,
+                        chunk_size=int(chunk_size),
+                        progress=show_throughput,
+                    )
+                    results = None
+                    if os.path.exists(destination):
+                        with open(destination, "rb") as file:
+                            results = file.read()
+                except Exception as error:
+                    st.error(f"Could not value the grant file: {error}")
+                    stats = None
+
+            if stats is not None:
+                st.write(
+                    f"**Contracts**: {stats['rows']:,} in {stats['chunks']} chunks, "
+                    f"{stats['seconds']:.2f}s ({stats['rows_per_second']:,.0f} rows/s)"
+                )
+                st.write(f"**Total Mesop Value**: {stats['total_value']:,.2f}")
+                if results is None:
+                    st.warning("The grant file has no contracts.")
+                else:
+                    st.download_button(
+                        "Download results (Parquet)",
+                        results,
+                        file_name="black_scholes_results.parquet",
+                    )
+
+    elif option_type == "American":
+        american_mode = st.radio("Input", ["Single contract", "Batch table"])
+
+        if american_mode == "Single contract":
+            S = st.number_input(
+                "Asset Value at Valuation Date (S)", value=2100.0, min_value=0.0
+            )
+            K = st.number_input("Strike Price (K)", value=1500.0, min_value=0.0)
+            T = st.number_input("Maturity in Years (T)", value=2.0, min_value=0.1)
+            r = st.number_input(
+                "Risk-free Rate (r)", value=0.0583, min_value=0.0, format="%.4f"
+            )
+            sigma = st.number_input(
+                "Yearly Volatility (sigma)", value=0.3464, min_value=0.0, format="%.4f"
+            )
+            q = st.number_input(
+                "Dividend Yield (q)", value=0.0, min_value=0.0, format="%.4f"
+            )
+            american_type = st.selectbox("Call or Put", ["call", "put"])
+            steps = T * 12
+            if st.button("Calculate and Plot"):
+                binomial_tree_pricing(
+                    S, K, T, r, sigma, int(steps), q, option_type=american_type
+                )
+        else:
+            st.subheader("Interactive Binomial Tree Input")
+            df_am = st.data_editor(
+                pd.DataFrame(DEFAULT_GRANTS), num_rows="dynamic", use_container_width=True
+            )
+            method = st.selectbox(
+                "Pricing method",
+                ["binomial", "bjerksund_stensland", "barone_adesi_whaley"],
+            )
+            if st.button("Calculate"):
+                st.dataframe(binomial_tree_batch(df_am, method=method))
 
     else:
         mc_option_type = st.selectbox("Select Type", ["option", "portfolio"])
@@ -73,12 +154,43 @@ def option_page():
             T = st.number_input("Time to maturity (years, T)", value=2.0)
             r = st.number_input("Risk-free interest rate (r)", value=0.0583)
             sigma = st.number_input("Volatility (sigma)", value=0.3464)
+            payoff_types = st.multiselect(
+                "Payoffs (the first one is charted)", list(PAYOFFS), default=["call"]
+            )
+            barrier = st.number_input("Barrier level (barrier payoffs)", value=2500.0)
+            M = st.number_input("Number of paths (M)", value=10000, min_value=1)
+            variance_reduction = st.selectbox(
+                "Variance reduction",
+                ["None", "antithetic", "control_variate", "moment_matching"],
+            )
+            sampler = st.selectbox("Sampler", ["pseudo", "sobol", "halton"])
+            streaming = st.checkbox("Streaming mode (constant memory)", value=False)
+            n_workers = st.number_input("Worker processes", value=1, min_value=1)
+            seed = st.number_input("Random seed", value=0, min_value=0)
 
-            if st.button("Calculate"):
+            if st.button("Calculate") and payoff_types:
                 option_price, std_error = monte_carlo_simulation(
-                    "option", S=S, K=K, T=T, r=r, sigma=sigma
+                    "option",
+                    S=S,
+                    K=K,
+                    T=T,
+                    r=r,
+                    sigma=sigma,
+                    M=int(M),
+                    payoff_type=payoff_types,
+                    barrier=barrier,
+                    variance_reduction=(
+                        None if variance_reduction == "None" else variance_reduction
+                    ),
+                    sampler=sampler,
+                    streaming=streaming,
+                    n_workers=int(n_workers),
+                    seed=int(seed),
+                )
+                st.write(
+                    f"Estimated {payoff_types[0].replace('_', ' ').title()} "
+                    f"Option Price: ${option_price:.2f}"
                 )
-                st.write(f"Estimated Call Option Price: ${option_price:.2f}")
                 st.write(f"Standard Error: ±{std_error:.2f}")
 
         elif mc_option_type == "portfolio":
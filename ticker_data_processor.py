@@ -1,21 +1,107 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
+import yfinance as yf
 from financial_data_fetcher import get_financial_data
+from market_data_cache import market_data_cache
 from multiples_calculator import calculate_multiples
 
 
-def get_ticker_data(ticker_list):
+class TokenBucket:
+    # Thread-safe token bucket: at most `capacity` requests in a burst and
+    # `rate` requests per second on average
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class _RateLimitedTicker:
+    # Building a ticker object does no I/O; reading info, balance_sheet or
+    # financials does, so every attribute read waits for a token
+    def __init__(self, stock, limiter):
+        self._stock = stock
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        self._limiter.acquire()
+        return getattr(self._stock, name)
+
+
+def _fetch_with_retries(ticker, provider, cache, limiter, retries, backoff):
+    # Cache hits never build a ticker object, so they are not throttled;
+    # failures back off exponentially with jitter so retries from several
+    # threads do not line up
+    def limited_provider(symbol):
+        return _RateLimitedTicker(provider(symbol), limiter)
+
+    for attempt in range(retries + 1):
+        try:
+            return get_financial_data(ticker, limited_provider, cache)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2**attempt * (1 + random.random()))
+
+
+def get_ticker_data(
+    ticker_list,
+    provider=yf.Ticker,
+    max_workers=8,
+    requests_per_second=4,
+    retries=2,
+    backoff=0.5,
+    cache=market_data_cache,
+):
+    # Comparables are fetched concurrently behind a shared rate limit. Rows
+    # keep the input order; tickers that still fail after their retries are
+    # left out and reported in df.attrs["failed"]
+    limiter = TokenBucket(requests_per_second)
     data_list = []
+    failed = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                _fetch_with_retries, ticker, provider, cache, limiter, retries, backoff
+            )
+            for ticker in ticker_list
+        ]
+        for ticker, future in zip(ticker_list, futures):
+            try:
+                financial_data = future.result()
+            except Exception as e:
+                failed[ticker] = f"{type(e).__name__}: {e}"
+                continue
 
-    for ticker in ticker_list:
-        # Fetch financial data
-        financial_data = get_financial_data(ticker)
+            # Calculate multiples
+            multiples = calculate_multiples(financial_data)
 
-        # Calculate multiples
-        multiples = calculate_multiples(financial_data)
+            # Combine financial data and multiples into one dictionary
+            combined_data = {**financial_data, **multiples}
+            data_list.append(combined_data)
 
-        # Combine financial data and multiples into one dictionary
-        combined_data = {**financial_data, **multiples}
-        data_list.append(combined_data)
+    if not data_list:
+        return None
 
     # Convert the list of dictionaries into a DataFrame and replace NaN values with averages
     df = pd.DataFrame(data_list)
@@ -28,5 +114,6 @@ def get_ticker_data(ticker_list):
         "Enterprise Value to EBITDA (Enterprise)",
     ]
     df[num_cols] = df[num_cols].fillna(df[num_cols].mean())
+    df.attrs["failed"] = failed
 
     return df
@@ -1,11 +1,24 @@
 import yfinance as yf
 import numpy as np
+import pandas as pd
 import streamlit as st
+from market_data_cache import market_data_cache
 
 
-def calculate_volatility(ticker_list, period="1y"):
+def _download_prices(ticker_list, period):
+    prices = yf.download(ticker_list, period=period)["Adj Close"]
+    return prices.to_frame() if isinstance(prices, pd.Series) else prices
+
+
+def calculate_volatility(ticker_list, period="1y", cache=market_data_cache):
     try:
-        data = yf.download(ticker_list, period=period)["Adj Close"]
+        if cache is None:
+            data = _download_prices(ticker_list, period)
+        else:
+            key = ticker_list if isinstance(ticker_list, str) else ",".join(ticker_list)
+            data = cache.get(
+                key, "prices", period, lambda: _download_prices(ticker_list, period)
+            )
         daily_returns = data.pct_change().dropna()
         volatilities = daily_returns.std() * np.sqrt(252)
         return volatilities